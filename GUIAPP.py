@@ -2,14 +2,313 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import threading
 import queue
+import time
+import os
+import json
+import tempfile
+from collections import deque
 from datetime import datetime
 import sys
 import io
 
-# Import your existing parts
-from part1 import start_speech_recognition
-from part2 import filter_toxicity
-from part3 import process_and_speak
+# Import your existing parts (models load lazily, see warm_up())
+import part1
+import part2
+import part3
+import tracing
+from part1 import start_speech_recognition, AdaptiveController, ADAPTIVE_CONTROL
+from part3 import process_and_speak, speak_censored_audio
+
+FILTER_WORKERS = 4            # phrases filtered concurrently (batched by part2.scheduler)
+FILTER_BACKLOG_LIMIT = 32     # phrases waiting for a worker before the policy kicks in
+FILTER_BACKLOG_POLICY = "drop_oldest"  # or "drop_newest"
+
+# Run capture, ASR, scoring and TTS output as separate processes (see pipeline.py);
+# the GUI then only displays results
+MULTIPROCESS_PIPELINE = False
+
+SPEECH_QUEUE_LIMIT = 6        # phrases waiting for TTS before the oldest is dropped
+SPEECH_MAX_AGE = 8.0          # seconds since capture before a phrase is too stale to speak
+SPEECH_POLICY = "drop_stale"  # "drop_stale", "coalesce" or "newest"
+
+TRANSCRIPT_MAX_LINES = 500    # lines kept in each transcript pane; older ones are evicted
+TRANSCRIPT_FRAME_MS = 16      # new lines are inserted at most once per frame
+TRANSCRIPT_HISTORY_FILE = None  # JSON Lines file with every phrase (None: temp file for the session)
+
+
+class OrderedFilterPool:
+    """
+    Fixed-size pool of filtering threads. Every submitted phrase gets a
+    sequence number and results are delivered strictly in that order,
+    however the workers finish. When more than backlog_limit phrases are
+    waiting, "drop_oldest" discards the oldest waiting phrase and
+    "drop_newest" rejects the new one. Dropped phrases release their
+    sequence number so later results are not held up. Phrases submitted
+    with block=True (uploaded files) are never shed: the caller waits for
+    room in the backlog instead.
+    """
+
+    def __init__(self, filter_fn, deliver, workers=FILTER_WORKERS,
+                 backlog_limit=FILTER_BACKLOG_LIMIT, policy=FILTER_BACKLOG_POLICY):
+        self.filter_fn = filter_fn  # called as filter_fn(text, context) on a worker
+        self.deliver = deliver  # called as deliver(text, filtered_text, context), in order
+        self.backlog_limit = backlog_limit
+        self.policy = policy
+        self._jobs = deque()    # (seq, text, context, sheddable) waiting for a worker
+        self._done = {}         # seq -> result, or None if dropped/failed
+        self._ready = deque()   # (seq, result) released in sequence order
+        self._next_seq = 0
+        self._next_release = 0
+        self._next_delivered = 0
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)   # workers wait for jobs
+        self._space = threading.Condition(self._lock)  # blocking submits wait for room
+        self._delivered = threading.Condition(self._lock)  # wait_delivered() callers
+        self._deliver_lock = threading.Lock()
+        self.dropped = 0
+        self.failed = 0
+        for i in range(workers):
+            threading.Thread(target=self._worker, daemon=True, name=f"filter-{i}").start()
+
+    def submit(self, text, context=None, block=False):
+        """
+        Queue a phrase. Returns its sequence number, or None if rejected.
+        With block=True, waits while the backlog is full instead.
+        """
+        with self._cond:
+            if block:
+                while len(self._jobs) >= self.backlog_limit:
+                    self._space.wait()
+            elif len(self._jobs) >= self.backlog_limit:
+                self.dropped += 1
+                oldest = next((job for job in self._jobs if job[3]), None)
+                if self.policy == "drop_newest" or oldest is None:
+                    return None
+                self._jobs.remove(oldest)
+                self._complete(oldest[0], None)
+            seq = self._next_seq
+            self._next_seq += 1
+            self._jobs.append((seq, text, context, not block))
+            self._cond.notify()
+        # Delivery only happens on workers: the callback uses root.after,
+        # which must not be waited on from the Tk thread
+        return seq
+
+    def _complete(self, seq, result):
+        """Record a result and release everything that is now in order (lock held)."""
+        self._done[seq] = result
+        while self._next_release in self._done:
+            self._ready.append((self._next_release, self._done.pop(self._next_release)))
+            self._next_release += 1
+
+    def _flush(self):
+        """Deliver released results; the lock keeps deliveries in order."""
+        with self._deliver_lock:
+            while True:
+                with self._cond:
+                    if not self._ready:
+                        return
+                    seq, result = self._ready.popleft()
+                try:
+                    if result is not None:
+                        self.deliver(*result)
+                except Exception as e:
+                    print(f"Filter delivery error: {e}")
+                with self._cond:
+                    self._next_delivered = seq + 1
+                    self._delivered.notify_all()
+
+    def wait_delivered(self, seq, timeout=None):
+        """Wait until phrase seq has been delivered (or dropped). Returns False on timeout."""
+        with self._cond:
+            return self._delivered.wait_for(lambda: self._next_delivered > seq, timeout)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._jobs:
+                    self._cond.wait()
+                seq, text, context, _ = self._jobs.popleft()
+                self._space.notify()
+            try:
+                result = (text, self.filter_fn(text, context), context)
+            except Exception as e:
+                print(f"Filter error: {e}")
+                result = None
+            with self._cond:
+                if result is None:
+                    self.failed += 1
+                self._complete(seq, result)
+            self._flush()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "submitted": self._next_seq,
+                "backlog": len(self._jobs),
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
+
+
+class SpeechQueue:
+    """
+    Bounded TTS queue of (filtered_text, utterance, captured_at, trace)
+    items, captured_at being the time.perf_counter() at which the phrase's
+    first audio frame was captured. Items with captured_at None (uploaded
+    files) are never shed: they don't age or count against the limit.
+    The policy is applied when the TTS worker takes the next item:
+    "drop_stale" skips phrases older than max_age, "coalesce" merges
+    waiting text phrases into one synthesis call (and drops stale ones),
+    "newest" skips straight to the latest live phrase. on_drop(item) is
+    called for every item that is dropped or merged away.
+    """
+
+    def __init__(self, limit=SPEECH_QUEUE_LIMIT, max_age=SPEECH_MAX_AGE, policy=SPEECH_POLICY,
+                 on_drop=None):
+        self.limit = limit
+        self.max_age = max_age
+        self.policy = policy
+        self.on_drop = on_drop
+        self._items = deque()
+        self._cond = threading.Condition()
+        self.dropped = 0
+        self.merged = 0
+
+    def _drop(self, item):
+        tracing.finish(item[3])
+        if self.on_drop is not None:
+            self.on_drop(item)
+
+    def _shed(self, keep):
+        """Drop every live item that keep(item) rejects (lock held)."""
+        kept = deque()
+        for item in self._items:
+            if item[2] is None or keep(item):
+                kept.append(item)
+            else:
+                self._drop(item)
+                self.dropped += 1
+        self._items = kept
+
+    def put(self, item):
+        with self._cond:
+            self._items.append(item)
+            live = [i for i in self._items if i[2] is not None]
+            oldest = live[:max(0, len(live) - self.limit)]
+            if oldest:
+                self._shed(lambda i: not any(i is o for o in oldest))
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Return the next item to speak, or raise queue.Empty after timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items, timeout):
+                raise queue.Empty
+            if self.policy == "newest":
+                live = [i for i in self._items if i[2] is not None]
+                newest = live[-1] if live else None
+                self._shed(lambda i: i is newest)
+                return self._items.popleft()
+
+            now = time.perf_counter()
+            self._shed(lambda i: now - i[2] <= self.max_age)
+            if not self._items:
+                raise queue.Empty
+            item = self._items.popleft()
+
+            if self.policy == "coalesce" and item[1] is None:
+                texts = [item[0]]
+                while self._items and self._items[0][1] is None:
+                    merged = self._items.popleft()
+                    texts.append(merged[0])
+                    self._drop(merged)
+                    self.merged += 1
+                item = (" ".join(t for t in texts if t.strip()), None, item[2], item[3])
+            return item
+
+    def clear(self):
+        """Drop everything waiting. Returns how many items were removed."""
+        with self._cond:
+            cleared = len(self._items)
+            for item in self._items:
+                self._drop(item)
+            self._items.clear()
+            return cleared
+
+    def stats(self):
+        with self._cond:
+            return {"waiting": len(self._items), "dropped": self.dropped, "merged": self.merged}
+
+
+class TranscriptHistory:
+    """
+    Append-only JSON Lines store of every displayed phrase, so the panes
+    can cap their scrollback without losing anything. Only the byte offset
+    of each record stays in memory; page() reads records back from disk.
+    """
+
+    def __init__(self, path=TRANSCRIPT_HISTORY_FILE):
+        self.temporary = path is None
+        if self.temporary:
+            fd, path = tempfile.mkstemp(prefix="echoclean-transcript-", suffix=".jsonl")
+            os.close(fd)
+        self.path = path
+        self.file = open(path, "w+b")
+        self.offsets = []
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def append(self, records):
+        self.file.seek(0, os.SEEK_END)
+        for record in records:
+            self.offsets.append(self.file.tell())
+            self.file.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.file.flush()
+
+    def page(self, start, count):
+        """Return up to count records starting at index start (oldest is 0)."""
+        if start >= len(self.offsets):
+            return []
+        self.file.seek(self.offsets[start])
+        return [json.loads(self.file.readline()) for _ in range(min(count, len(self.offsets) - start))]
+
+    def clear(self):
+        self.file.seek(0)
+        self.file.truncate()
+        self.offsets = []
+
+    def close(self):
+        self.file.close()
+        if self.temporary:
+            os.remove(self.path)
+
+
+def transcript_segments(original_text, filtered_text):
+    """
+    Split a phrase into (text, tag) pairs for the original and filtered
+    panes. Returns (original_segments, filtered_segments, censored_count).
+    """
+    words = original_text.split()
+    filtered_words = filtered_text.split()
+    original, censored = [], 0
+    for orig_word, filt_word in zip(words, filtered_words):
+        if filt_word == "****":
+            original.append((orig_word + " ", "toxic"))
+            censored += 1
+        else:
+            original.append((orig_word + " ", ()))
+    filtered = [(word + " ", "censored" if word == "****" else ()) for word in filtered_words]
+    return original, filtered, censored
+
+
+def trim_lines(widget, max_lines):
+    """Delete the oldest lines of a Text widget beyond max_lines."""
+    lines = int(widget.index("end-1c").split(".")[0]) - 1  # content ends with a newline
+    if lines > max_lines:
+        widget.delete("1.0", f"{lines - max_lines + 1}.0")
+
 
 class ToxicityFilterGUI:
     def __init__(self, root):
@@ -21,10 +320,23 @@ class ToxicityFilterGUI:
         # Variables
         self.is_listening = False
         self.text_queue = queue.Queue()
-        self.speech_queue = queue.Queue()  # Queue for TTS output
+        # TTS output: (filtered_text, utterance, captured_at, trace); shed phrases cancel their prefetch
+        self.speech_queue = SpeechQueue(on_drop=self.discard_speech)
         self.listening_thread = None
         self.stop_flag = threading.Event()
         self.stop_tts_flag = threading.Event()  # Flag to interrupt TTS
+        self.tts_busy = threading.Event()  # Set while the TTS worker is speaking
+        self.pipeline = None  # multi-process pipeline while listening (MULTIPROCESS_PIPELINE)
+        self.asr_controller = None  # AdaptiveController of the live recognizer (footer stats)
+        self.wakeup_lock = threading.Lock()
+        self.wakeup_pending = False  # a check_queue call is scheduled
+        self.pending_lines = []  # (timestamp, original, filtered) waiting for the next frame
+        self.flush_scheduled = False
+        self.history = TranscriptHistory()  # every phrase; the panes only keep the latest
+        self.history_window = None
+        
+        # Filter phrases on a fixed pool; results come back in spoken order
+        self.filter_pool = OrderedFilterPool(self.filter_phrase, self.deliver_filtered)
         
         # Start TTS worker thread
         self.start_tts_worker()
@@ -32,8 +344,8 @@ class ToxicityFilterGUI:
         # Setup UI
         self.setup_ui()
         
-        # Start queue checker
-        self.check_queue()
+        # Load models in the background so the window appears immediately
+        self.start_model_warmup()
         
         # Window close handler
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
@@ -93,6 +405,15 @@ class ToxicityFilterGUI:
                              **button_style)
         clear_btn.grid(row=0, column=2, padx=10)
         
+        # Beep the speaker's own voice instead of re-synthesizing with TTS
+        self.audio_censor = tk.BooleanVar(value=False)
+        audio_check = tk.Checkbutton(control_frame, text="🔊 Beep original voice",
+                                     variable=self.audio_censor,
+                                     font=("Segoe UI", 11), bg="#0a0a0f", fg="#888888",
+                                     selectcolor="#1a1a2e", activebackground="#0a0a0f",
+                                     activeforeground="#00ff88", bd=0)
+        audio_check.grid(row=0, column=3, padx=10)
+        
         # Status indicator
         self.status_frame = tk.Frame(self.root, bg="#0a0a0f")
         self.status_frame.pack(pady=10)
@@ -105,6 +426,10 @@ class ToxicityFilterGUI:
                                      font=("Segoe UI", 11), bg="#0a0a0f", fg="#888888")
         self.status_label.pack(side=tk.LEFT)
         
+        self.model_label = tk.Label(self.status_frame, text="⏳ Loading models...", 
+                                    font=("Segoe UI", 10), bg="#0a0a0f", fg="#ffd93d")
+        self.model_label.pack(side=tk.LEFT, padx=(20, 0))
+        
         # ============= MAIN CONTENT AREA =============
         content_frame = tk.Frame(self.root, bg="#0a0a0f")
         content_frame.pack(fill=tk.BOTH, expand=True, padx=30, pady=10)
@@ -173,67 +498,123 @@ class ToxicityFilterGUI:
                                     font=("Segoe UI", 10), 
                                     bg="#1a1a2e", 
                                     fg="#888888")
-        self.stats_label.pack(pady=18)
+        self.stats_label.pack(side=tk.LEFT, expand=True, pady=18)
+        
+        export_btn = tk.Button(stats_frame, text="📈 Export Latency",
+                               font=("Segoe UI", 9), bg="#1a1a2e", fg="#888888",
+                               activebackground="#16213e", activeforeground="#00ff88",
+                               relief=tk.FLAT, cursor="hand2",
+                               command=self.export_latency)
+        export_btn.pack(side=tk.RIGHT, padx=15)
+        
+        history_btn = tk.Button(stats_frame, text="📜 History",
+                                font=("Segoe UI", 9), bg="#1a1a2e", fg="#888888",
+                                activebackground="#16213e", activeforeground="#00ff88",
+                                relief=tk.FLAT, cursor="hand2",
+                                command=self.show_history)
+        history_btn.pack(side=tk.RIGHT)
+    
+    def start_model_warmup(self):
+        """Start background model loading and show readiness in the status bar"""
+        if MULTIPROCESS_PIPELINE:
+            # The stage processes load their own models when listening starts
+            self.model_label.config(text="🧩 Models load with the pipeline", fg="#888888")
+            return
+        self.warmup_threads = [part2.warm_up(), part3.warm_up()]
+        
+        # Load the Vosk model once so Start/Stop doesn't reload it from disk
+        vosk_thread = part1.preload_vosk_model()
+        if vosk_thread:
+            self.warmup_threads.append(vosk_thread)
+        self.check_models_ready()
+    
+    def check_models_ready(self):
+        """Poll warm-up progress until the models are loaded"""
+        loading = any(t.is_alive() for t in self.warmup_threads)
+        if part2.model_ready.is_set() and part3.audio_ready.is_set():
+            self.model_label.config(text="🧠 Models ready", fg="#00ff88")
+        elif loading:
+            self.root.after(200, self.check_models_ready)
+        else:
+            # Warm-up failed; models will be retried on first use
+            self.model_label.config(text="⚠️ Models load on first use", fg="#ff6b6b")
+    
+    def check_pipeline_ready(self):
+        """Poll the pipeline stages until each has loaded its models"""
+        if self.pipeline is None:
+            return
+        ready = self.pipeline.stats()["ready"]
+        waiting = [name for name, is_ready in ready.items() if not is_ready]
+        if waiting:
+            self.model_label.config(text=f"⏳ Loading pipeline: {', '.join(waiting)}...", fg="#ffd93d")
+            self.root.after(200, self.check_pipeline_ready)
+        else:
+            self.model_label.config(text="🧠 Pipeline ready", fg="#00ff88")
     
     def start_tts_worker(self):
         """Start a worker thread that processes TTS queue sequentially"""
         def tts_worker():
             while True:
                 try:
-                    filtered_text = self.speech_queue.get(timeout=1)
-                    if filtered_text is None:  # Poison pill to stop worker
+                    item = self.speech_queue.get(timeout=1)
+                    if item is None:  # Poison pill to stop worker
                         break
+                    filtered_text, utterance, captured, trace = item
                     
                     # Check if we should skip this item
                     if self.stop_tts_flag.is_set():
-                        self.speech_queue.task_done()
+                        tracing.finish(trace)
                         continue
                     
+                    
+                    self.tts_busy.set()
                     try:
                         # This blocks, but it's in its own thread so speech recognition continues
-                        process_and_speak(filtered_text)
+                        if utterance is not None:
+                            speak_censored_audio(utterance, filtered_text, trace)
+                        else:
+                            process_and_speak(filtered_text, trace)
                     except Exception as e:
                         print(f"TTS error: {e}")
+                    finally:
+                        self.tts_busy.clear()
+                        tracing.finish(trace)
                     
-                    self.speech_queue.task_done()
+                    # Refresh the skipped/merged counts in the footer
+                    self.root.after(0, self.update_stats)
                 except queue.Empty:
                     continue
         
         self.tts_thread = threading.Thread(target=tts_worker, daemon=True)
         self.tts_thread.start()
     
+    def discard_speech(self, item):
+        """Called by the speech queue for a phrase it will not speak"""
+        if item[1] is None:
+            part3.discard_prefetched(item[0])
+    
     def stop_tts(self):
-        """Stop all queued TTS and clear the queue - FORCEFUL"""
+        """Stop all queued TTS and clear the queue - immediate, no device re-init"""
         print("🛑 Stopping TTS...")
         
         # Set stop flag
         self.stop_tts_flag.set()
         
         # Clear the queue
-        cleared = 0
-        while not self.speech_queue.empty():
-            try:
-                self.speech_queue.get_nowait()
-                cleared += 1
-            except queue.Empty:
-                break
+        cleared = self.speech_queue.clear()
         
         if cleared > 0:
             print(f"   Cleared {cleared} queued items")
         
-        # Stop pygame mixer
+        # The pipeline's output process owns playback in multi-process mode
+        if self.pipeline is not None:
+            self.pipeline.flush_output()
+        
+        # Cut playback within one output buffer and drop synthesis ahead
         try:
-            import pygame
-            pygame.mixer.music.stop()
-            pygame.mixer.music.unload()
-            pygame.mixer.quit()
-            
-            # Small delay then reinitialize
-            import time
-            time.sleep(0.2)
-            pygame.mixer.init(frequency=22050, size=-16, channels=2, buffer=512)
+            part3.stop_playback()
         except Exception as e:
-            print(f"   Mixer error: {e}")
+            print(f"   Playback error: {e}")
         
         # Clear flag for next use
         self.stop_tts_flag.clear()
@@ -255,17 +636,42 @@ class ToxicityFilterGUI:
         self.status_dot.config(fg="#00ff88")
         self.status_label.config(text="🎧 Listening... Speak now!", fg="#00ff88")
         
+        if MULTIPROCESS_PIPELINE:
+            self.start_pipeline()
+            return
+        
         def listen_thread():
             try:
+                # Keep a handle on the adaptive controller for the footer
+                self.asr_controller = AdaptiveController() if ADAPTIVE_CONTROL else None
                 # Call start_speech_recognition with our stop_flag
-                start_speech_recognition(self.handle_recognized_text, self.stop_flag)
+                start_speech_recognition(self.handle_recognized_text, self.stop_flag,
+                                         utterance_callback=self.handle_recognized_utterance,
+                                         partial_callback=self.handle_partial_words,
+                                         controller=self.asr_controller)
             except Exception as e:
-                self.text_queue.put(("error", str(e)))
+                self.post("error", str(e))
                 self.stop_listening()
         
         self.listening_thread = threading.Thread(target=listen_thread, daemon=True)
         self.listening_thread.start()
     
+    def start_pipeline(self):
+        """Start the multi-process pipeline and forward its results to the GUI"""
+        import pipeline
+        self.pipeline = pipeline.Pipeline().start()
+        
+        def forward_results(active):
+            while not active.stop_event.is_set():
+                try:
+                    msg = active.results.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                self.post("filtered", msg)
+        
+        threading.Thread(target=forward_results, args=(self.pipeline,), daemon=True).start()
+        self.check_pipeline_ready()
+    
     def stop_listening(self):
         """Stop live speech recognition by setting the stop flag"""
         if not self.is_listening:
@@ -274,6 +680,12 @@ class ToxicityFilterGUI:
         self.is_listening = False
         self.stop_flag.set()  # Signal part1 to stop
         
+        if self.pipeline is not None:
+            # Joining the stage processes can take a moment; keep the window responsive
+            threading.Thread(target=self.pipeline.stop, daemon=True).start()
+            self.pipeline = None
+            self.model_label.config(text="🧩 Models load with the pipeline", fg="#888888")
+        
         # Also stop TTS
         self.stop_tts()
         
@@ -287,14 +699,38 @@ class ToxicityFilterGUI:
         Called automatically when part1 detects speech.
         """
         # Add to queue for GUI processing
-        self.text_queue.put(("speech", text))
+        trace = tracing.start()
+        tracing.mark(trace, "asr_final")
+        self.post("speech", (text, time.perf_counter(), trace))
+    
+    def handle_partial_words(self, words, trace):
+        """
+        Called by part1 with words that just became stable in the partial
+        hypothesis. Scoring them now fills part2's score cache, so the
+        final result only re-scores words the recognizer changed.
+        """
+        future = part2.scheduler.submit(" ".join(words), verbose=False)
+        
+        def done(future):
+            if future.exception() is not None:
+                return
+            _, flagged = future.result()
+            if flagged:
+                tracing.mark(trace, "first_flag")
+                self.post("early_flag", [word for _, word, _ in flagged])
+        
+        future.add_done_callback(done)
+    
+    def handle_recognized_utterance(self, utterance):
+        """Called by part1 with the text, word timings, original audio and capture time"""
+        self.post("utterance", utterance)
     
     def upload_audio_file(self):
         """Upload and process audio file"""
         filename = filedialog.askopenfilename(
             title="Select Audio File",
             filetypes=[
-                ("Audio Files", "*.wav *.mp3 *.flac *.ogg"),
+                ("WAV Files", "*.wav"),
                 ("All Files", "*.*")
             ]
         )
@@ -302,79 +738,194 @@ class ToxicityFilterGUI:
         if not filename:
             return
         
-        import os
         self.status_label.config(text=f"🔄 Processing: {os.path.basename(filename)}", fg="#4a90e2")
         
         def process_file():
             try:
-                import speech_recognition as sr
-                recognizer = sr.Recognizer()
-                
-                with sr.AudioFile(filename) as source:
-                    audio = recognizer.record(source)
-                    text = recognizer.recognize_google(audio)
-                    self.text_queue.put(("file", text))
+                # Stream the file through Vosk in fixed-size chunks and show
+                # each phrase as soon as it is recognized (offline, flat memory).
+                # Recognition outpaces filtering, so wait for room in the filter
+                # backlog rather than letting it shed transcript lines
+                phrases, seq = 0, None
+                for result in part1.stream_wav_results(filename):
+                    trace = tracing.start()
+                    tracing.mark(trace, "asr_final")
+                    timestamp = datetime.now().strftime("%H:%M:%S")
+                    # captured=None: file phrases are never shed by the speech queue
+                    seq = self.filter_pool.submit(result["text"], (timestamp, None, None, trace),
+                                                  block=True)
+                    phrases += 1
+                # Report once the last phrase has been filtered and displayed
+                if seq is not None:
+                    self.filter_pool.wait_delivered(seq)
+                self.post("file_done", phrases)
             except Exception as e:
-                self.text_queue.put(("error", f"File processing error: {str(e)}"))
+                self.post("error", f"File processing error: {str(e)}")
         
         threading.Thread(target=process_file, daemon=True).start()
     
-    def process_text(self, original_text):
-        """Process text through your filter_toxicity function"""
-        def process_in_thread():
-            # Add timestamp
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            
-            # Call your filter_toxicity function from part2
-            filtered_text = filter_toxicity(original_text)
-            
-            # Schedule GUI updates in main thread
-            self.root.after(0, lambda: self.update_gui(original_text, filtered_text, timestamp))
-            
-            # Add to TTS queue instead of blocking here
-            # The TTS worker will handle it sequentially without blocking recognition
-            self.speech_queue.put(filtered_text)
-        
-        # Run processing in separate thread to avoid blocking speech recognition
-        threading.Thread(target=process_in_thread, daemon=True).start()
+    def process_text(self, original_text, captured, trace=None, utterance=None):
+        """Queue text for filtering; results are delivered in order by deliver_filtered"""
+        # Live utterances keep their audio when beeping the original voice
+        keep_audio = utterance if self.audio_censor.get() else None
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        
+        if self.filter_pool.submit(original_text, (timestamp, captured, keep_audio, trace)) is None:
+            print(f"⏭️ Filter backlog full, skipped: {original_text}")
+    
+    def filter_phrase(self, original_text, context):
+        """Filter one phrase on a pool worker, stamping the filter stage"""
+        trace = context[3]
+        tracing.mark(trace, "filter_start")
+        filtered_text = part2.filter_toxicity_scheduled(original_text)
+        tracing.mark(trace, "filter_end")
+        return filtered_text
+    
+    def deliver_filtered(self, original_text, filtered_text, context):
+        """Called by the filter pool, in phrase order, from a worker thread"""
+        timestamp, captured, keep_audio, trace = context
+        
+        # Display on the main thread
+        self.post("display", (original_text, filtered_text, timestamp))
+        
+        # Add to TTS queue instead of blocking here
+        # The TTS worker will handle it sequentially without blocking recognition
+        # Start synthesizing now if the TTS worker is still busy speaking
+        # (not when coalescing: merged phrases are synthesized as one)
+        if (keep_audio is None and self.tts_busy.is_set() and filtered_text.strip()
+                and self.speech_queue.policy != "coalesce"):
+            part3.prefetch(filtered_text)
+        self.speech_queue.put((filtered_text, keep_audio, captured, trace))
     
     def update_gui(self, original_text, filtered_text, timestamp):
-        """Update GUI elements (must be called from main thread)"""
-        # Update original text panel
-        self.original_text.insert(tk.END, f"[{timestamp}] ", "timestamp")
-        
-        # Highlight toxic words in original
-        words = original_text.split()
-        filtered_words = filtered_text.split()
-        
-        for orig_word, filt_word in zip(words, filtered_words):
-            if filt_word == "****":
-                self.original_text.insert(tk.END, orig_word + " ", "toxic")
-                self.total_filtered += 1
-            else:
-                self.original_text.insert(tk.END, orig_word + " ")
-        
-        self.original_text.insert(tk.END, "\n")
-        self.original_text.see(tk.END)
-        
-        # Update filtered text panel
-        self.filtered_text.insert(tk.END, f"[{timestamp}] ", "timestamp")
-        
-        for word in filtered_words:
-            if word == "****":
-                self.filtered_text.insert(tk.END, word + " ", "censored")
-            else:
-                self.filtered_text.insert(tk.END, word + " ")
+        """Queue a phrase for the transcript panes (main thread); drawn on the next frame"""
+        self.pending_lines.append((timestamp, original_text, filtered_text))
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            self.root.after(TRANSCRIPT_FRAME_MS, self.flush_transcripts)
+    
+    def flush_transcripts(self):
+        """Insert all pending phrases with one insert per pane, then evict old lines"""
+        self.flush_scheduled = False
+        lines, self.pending_lines = self.pending_lines, []
+        if not lines:
+            return
         
-        self.filtered_text.insert(tk.END, "\n")
-        self.filtered_text.see(tk.END)
+        original_args, filtered_args = [], []
+        for timestamp, original_text, filtered_text in lines:
+            original, filtered, censored = transcript_segments(original_text, filtered_text)
+            self.total_filtered += censored
+            original_args += [f"[{timestamp}] ", "timestamp"]
+            filtered_args += [f"[{timestamp}] ", "timestamp"]
+            for text, tag in original:
+                original_args += [text, tag]
+            for text, tag in filtered:
+                filtered_args += [text, tag]
+            original_args += ["\n", ()]
+            filtered_args += ["\n", ()]
+        
+        for widget, args in ((self.original_text, original_args), (self.filtered_text, filtered_args)):
+            widget.insert(tk.END, *args)
+            trim_lines(widget, TRANSCRIPT_MAX_LINES)
+            widget.see(tk.END)
+        
+        self.history.append([{"time": timestamp, "original": original_text, "filtered": filtered_text}
+                             for timestamp, original_text, filtered_text in lines])
         
         # Update stats
-        self.total_phrases += 1
-        self.stats_label.config(text=f"Filtered: {self.total_filtered} words | Total: {self.total_phrases} phrases")
+        self.total_phrases += len(lines)
+        self.update_stats()
+    
+    def show_history(self):
+        """Page through every phrase of the session, TRANSCRIPT_MAX_LINES at a time"""
+        if self.history_window is not None and self.history_window.winfo_exists():
+            self.history_window.lift()
+            return
+        
+        window = tk.Toplevel(self.root, bg="#0a0a0f")
+        window.title("📜 Transcript History")
+        window.geometry("900x700")
+        self.history_window = window
+        
+        nav = tk.Frame(window, bg="#1a1a2e")
+        nav.pack(fill=tk.X)
+        view = tk.Text(window, font=("Consolas", 11), bg="#1e2a47", fg="#ffffff",
+                       relief=tk.FLAT, padx=20, pady=20, wrap=tk.WORD)
+        view.pack(fill=tk.BOTH, expand=True)
+        view.tag_config("toxic", foreground="#ff6b6b", font=("Consolas", 11, "bold"))
+        view.tag_config("censored", foreground="#ffd93d", font=("Consolas", 11, "bold"))
+        view.tag_config("timestamp", foreground="#888888", font=("Consolas", 9))
+        
+        page_size = TRANSCRIPT_MAX_LINES
+        position = {"start": max(0, len(self.history) - page_size)}
+        
+        def render():
+            start = position["start"]
+            records = self.history.page(start, page_size)
+            args = []
+            for record in records:
+                original, filtered, _ = transcript_segments(record["original"], record["filtered"])
+                args += [f"[{record['time']}] ", "timestamp"]
+                for text, tag in original:
+                    args += [text, tag]
+                args += ["\n           ", ()]
+                for text, tag in filtered:
+                    args += [text, tag]
+                args += ["\n", ()]
+            view.config(state=tk.NORMAL)
+            view.delete("1.0", tk.END)
+            if args:
+                view.insert(tk.END, *args)
+            view.config(state=tk.DISABLED)
+            view.see(tk.END)
+            page_label.config(text=f"Phrases {start + 1 if records else 0}-{start + len(records)} "
+                                   f"of {len(self.history)}")
+        
+        def move(delta):
+            last_page = max(0, len(self.history) - page_size)
+            position["start"] = min(max(0, position["start"] + delta), last_page)
+            render()
+        
+        nav_style = {"font": ("Segoe UI", 10), "bg": "#1a1a2e", "fg": "#888888", "relief": tk.FLAT,
+                     "activebackground": "#16213e", "activeforeground": "#00ff88", "cursor": "hand2"}
+        tk.Button(nav, text="◀ Older", command=lambda: move(-page_size), **nav_style).pack(side=tk.LEFT, padx=10, pady=8)
+        tk.Button(nav, text="Newer ▶", command=lambda: move(page_size), **nav_style).pack(side=tk.LEFT)
+        tk.Button(nav, text="⏭ Latest", command=lambda: move(len(self.history)), **nav_style).pack(side=tk.LEFT, padx=10)
+        page_label = tk.Label(nav, font=("Segoe UI", 10), bg="#1a1a2e", fg="#888888")
+        page_label.pack(side=tk.RIGHT, padx=15)
+        render()
+    
+    def update_stats(self):
+        """Refresh the footer statistics (main thread)"""
+        speech = self.speech_queue.stats()
+        text = f"Filtered: {self.total_filtered} words | Total: {self.total_phrases} phrases"
+        if speech["dropped"] or speech["merged"]:
+            text += f" | TTS skipped: {speech['dropped']}, merged: {speech['merged']}"
+        if self.asr_controller is not None:
+            asr = self.asr_controller.stats()
+            text += f" | ASR: {asr['model']} @ {asr['chunk_frames']} (RTF {asr['rtf']:.2f})"
+        latency = tracing.footer_text()
+        if latency:
+            text += f" | {latency}"
+        self.stats_label.config(text=text)
+    
+    def post(self, msg_type, data):
+        """Queue a message for the main thread and wake it (any thread)"""
+        self.text_queue.put((msg_type, data))
+        self.wake()
+    
+    def wake(self):
+        """Schedule one check_queue call unless one is already pending"""
+        with self.wakeup_lock:
+            if self.wakeup_pending:
+                return
+            self.wakeup_pending = True
+        self.root.after(0, self.check_queue)
     
     def check_queue(self):
-        """Check for new text from speech recognition - Non-blocking"""
+        """Handle queued messages on the main thread - scheduled by wake(), never polled"""
+        with self.wakeup_lock:
+            self.wakeup_pending = False
         try:
             # Process all available items quickly
             processed = 0
@@ -382,34 +933,56 @@ class ToxicityFilterGUI:
                 msg_type, data = self.text_queue.get_nowait()
                 
                 if msg_type == "speech":
-                    self.process_text(data)
-                elif msg_type == "file":
-                    self.process_text(data)
-                    self.status_label.config(text="✅ File processed successfully", fg="#00ff88")
+                    self.process_text(*data)
+                elif msg_type == "utterance":
+                    self.process_text(data["text"], data["captured"], data.get("trace"), data)
+                elif msg_type == "display":
+                    self.update_gui(*data)
+                elif msg_type == "filtered":
+                    # Already filtered (and spoken) by the pipeline processes
+                    timestamp = datetime.now().strftime("%H:%M:%S")
+                    self.update_gui(data["text"], data["filtered"], timestamp)
+                elif msg_type == "early_flag":
+                    self.status_label.config(text=f"🚫 Flagged while speaking: {', '.join(data)}", fg="#ff6b6b")
+                elif msg_type == "file_done":
+                    self.status_label.config(text=f"✅ File processed successfully ({data} phrases)", fg="#00ff88")
                 elif msg_type == "error":
                     messagebox.showerror("Error", data)
                     self.status_label.config(text="Ready to filter", fg="#888888")
                 
                 processed += 1
         except queue.Empty:
-            pass
+            return
         
-        # Check again very quickly for continuous operation
-        self.root.after(50, self.check_queue)  # Reduced from 100ms to 50ms
+        # More messages than one pass handles: continue after other events
+        self.wake()
+    
+    def export_latency(self):
+        """Save the per-stage latency histograms as JSON or Prometheus text"""
+        filename = filedialog.asksaveasfilename(
+            title="Export Latency Histograms",
+            defaultextension=".json",
+            filetypes=[("JSON", "*.json"), ("Prometheus text", "*.prom")]
+        )
+        if filename:
+            tracing.export(filename)
+            self.status_label.config(text=f"📈 Latency exported to {filename}", fg="#4a90e2")
     
     def clear_all(self):
         """Clear all text and stop speaking"""
         # Stop TTS first
         self.stop_tts()
         
-        # Clear text panels
+        # Clear text panels, lines not yet drawn and the history
+        self.pending_lines = []
         self.original_text.delete(1.0, tk.END)
         self.filtered_text.delete(1.0, tk.END)
+        self.history.clear()
         
         # Reset statistics
         self.total_phrases = 0
         self.total_filtered = 0
-        self.stats_label.config(text="Filtered: 0 words | Total: 0 phrases")
+        self.update_stats()
         
         print("🗑️ All cleared")
     
@@ -417,6 +990,7 @@ class ToxicityFilterGUI:
         """Handle window close"""
         if self.is_listening:
             self.stop_listening()
+        self.history.close()
         self.root.destroy()
 
 def main():
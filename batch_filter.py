@@ -0,0 +1,166 @@
+# batch_filter.py - Headless batch transcription + toxicity filtering of audio archives
+import os
+import sys
+import glob
+import json
+import time
+import wave
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+_model_path = None  # set in each worker by _init_worker
+
+
+def find_audio_files(inputs):
+    """Expand directories (recursively) and glob patterns into a sorted list of WAV files."""
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, names in os.walk(item):
+                files.extend(os.path.join(root, n) for n in names if n.lower().endswith(".wav"))
+        else:
+            files.extend(p for p in glob.glob(item, recursive=True) if os.path.isfile(p))
+    return sorted(set(files))
+
+
+def _init_worker(model_path):
+    """Load the Vosk and toxicity models once per worker process."""
+    global _model_path
+    sys.stdout = sys.stderr  # keep model loading chatter out of JSON Lines on stdout
+    import part1
+    import part2
+
+    _model_path = model_path  # resolved (and downloaded if needed) once by run_batch
+    part1.get_vosk_model(_model_path)
+    part2.get_model()
+
+
+def transcribe_file(path):
+    """
+    Transcribe one WAV with Vosk and filter every utterance with part2.
+    Returns a JSON-serializable record for the file.
+    """
+    import part1
+    import part2
+
+    started = time.perf_counter()
+    with wave.open(path, "rb") as wav_file:
+        duration = wav_file.getnframes() / wav_file.getframerate()
+
+    results = list(part1.stream_wav_results(path, _model_path))
+    analyzed = part2.analyze_toxicity_batch([r["text"] for r in results], verbose=False)
+
+    utterances = []
+    for result, (filtered, flagged) in zip(results, analyzed):
+        words = result.get("result", [])
+        utterances.append({
+            "start": words[0]["start"] if words else None,
+            "end": words[-1]["end"] if words else None,
+            "text": result["text"],
+            "filtered": filtered,
+            "flagged": [
+                {
+                    "word": word,
+                    "score": score,
+                    "start": words[i]["start"] if i < len(words) else None,
+                    "end": words[i]["end"] if i < len(words) else None,
+                }
+                for i, word, score in flagged
+            ],
+        })
+
+    return {
+        "file": path,
+        "duration_s": round(duration, 3),
+        "processing_s": round(time.perf_counter() - started, 3),
+        "flagged_words": sum(len(u["flagged"]) for u in utterances),
+        "utterances": utterances,
+    }
+
+
+def _safe_transcribe(path):
+    try:
+        return transcribe_file(path)
+    except Exception as e:
+        return {"file": path, "error": str(e)}
+
+
+def run_batch(files, output, workers=None, model_path=None):
+    """
+    Transcribe and filter files across a process pool, writing one JSON line
+    per file to `output`. Returns a throughput summary dict.
+    """
+    import part1
+
+    workers = workers or os.cpu_count() or 1
+    # Resolve the model here so the workers don't all download it at once
+    if model_path is None:
+        stdout, sys.stdout = sys.stdout, sys.stderr  # download progress stays off stdout
+        try:
+            model_path = part1.find_vosk_model() or part1.download_vosk_model()
+        finally:
+            sys.stdout = stdout
+    started = time.perf_counter()
+    audio_seconds, ok, failed, flagged = 0.0, 0, 0, 0
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_path,)) as pool:
+        futures = [pool.submit(_safe_transcribe, path) for path in files]
+        for future in as_completed(futures):
+            record = future.result()
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+
+            if "error" in record:
+                failed += 1
+                print(f"❌ {record['file']}: {record['error']}", file=sys.stderr)
+            else:
+                ok += 1
+                audio_seconds += record["duration_s"]
+                flagged += record["flagged_words"]
+                print(f"✅ {record['file']} ({record['duration_s']:.0f}s audio, "
+                      f"{record['flagged_words']} flagged)", file=sys.stderr)
+
+    wall_seconds = time.perf_counter() - started
+    return {
+        "files": len(files),
+        "ok": ok,
+        "failed": failed,
+        "workers": workers,
+        "flagged_words": flagged,
+        "audio_hours": audio_seconds / 3600,
+        "wall_hours": wall_seconds / 3600,
+        "audio_hours_per_wall_hour": audio_seconds / wall_seconds if wall_seconds else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Transcribe WAV files offline with Vosk and flag toxic words"
+    )
+    parser.add_argument("inputs", nargs="+", help="WAV files, directories or glob patterns")
+    parser.add_argument("-o", "--output", default="-", help="JSON Lines output file (default: stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--model", default=None, help="Vosk model directory")
+    args = parser.parse_args()
+
+    files = find_audio_files(args.inputs)
+    if not files:
+        parser.error("no WAV files found")
+
+    print(f"🎧 {len(files)} files", file=sys.stderr)
+    if args.output == "-":
+        summary = run_batch(files, sys.stdout, args.workers, args.model)
+    else:
+        with open(args.output, "w", encoding="utf-8") as output:
+            summary = run_batch(files, output, args.workers, args.model)
+
+    print(f"\n📊 {summary['ok']}/{summary['files']} files, "
+          f"{summary['audio_hours']:.2f} audio hours in {summary['wall_hours'] * 60:.1f} min "
+          f"-> {summary['audio_hours_per_wall_hour']:.1f} audio-hours per wall-hour "
+          f"({summary['workers']} workers)", file=sys.stderr)
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+# benchmark.py - Performance checks for EchoClean
+import io
+import os
+import sys
+import json
+import time
+import wave
+import queue
+import random
+import argparse
+import platform
+import threading
+import statistics
+import subprocess
+import contextlib
+from datetime import datetime, timezone
+
+import tracing
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in a fresh interpreter so every import is cold
+STARTUP_SCRIPT = r"""
+import json
+import time
+t0 = time.perf_counter()
+import GUIAPP
+t1 = time.perf_counter()
+import tkinter as tk
+root = tk.Tk()
+app = GUIAPP.ToxicityFilterGUI(root)
+root.update()
+t2 = time.perf_counter()
+print("STARTUP " + json.dumps({"import_s": t1 - t0, "window_s": t2 - t0}))
+root.destroy()
+"""
+
+
+def bench_startup(runs=5):
+    """Time `import GUIAPP` and first window paint in fresh processes."""
+    samples = []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT],
+            cwd=REPO_DIR, capture_output=True, text=True, timeout=120
+        )
+        lines = [l for l in proc.stdout.splitlines() if l.startswith("STARTUP ")]
+        if proc.returncode != 0 or not lines:
+            raise RuntimeError(f"startup run failed:\n{proc.stderr}")
+        samples.append(json.loads(lines[-1][len("STARTUP "):]))
+
+    return {
+        "runs": runs,
+        "import_s_median": statistics.median(s["import_s"] for s in samples),
+        "window_s_median": statistics.median(s["window_s"] for s in samples),
+        "window_s_max": max(s["window_s"] for s in samples),
+    }
+
+
+RATE = 16000
+CHUNK = 1024  # frames per chunk, as read from the mic in part1
+
+# Stub backends: deterministic stand-ins so the pipeline benchmark runs in
+# CI without model downloads, audio devices or network access
+STUB_VOCABULARY = ["hello", "there", "you", "are", "a", "nice", "day", "this", "is",
+                   "great", "thanks", "everyone", "damn", "idiot", "stupid"]
+STUB_TOXIC = {"damn", "idiot", "stupid"}
+STUB_ASR_RTF = 0.02             # decode time per second of audio
+STUB_PHRASE_SECONDS = 2.0       # a final result every this much voiced audio
+STUB_SCORE_SECONDS = (0.004, 0.0002)  # per model call, per text in the batch
+STUB_TTS_SECONDS_PER_CHAR = 0.001
+COMPARE_MIN_DELTA_MS = 1.0      # stage latency changes smaller than this are noise
+DRAIN_TIMEOUT = 60.0            # seconds to finish scoring and synthesis after the audio ends
+
+
+class StubRecognizer:
+    """KaldiRecognizer stand-in that emits a seeded phrase per STUB_PHRASE_SECONDS of audio"""
+
+    def __init__(self, rate=RATE, seed=0):
+        self.rate = rate
+        self.rng = random.Random(seed)
+        self.fed = 0            # samples fed so far
+        self.phrase_start = 0   # sample index where the current phrase began
+        self.words = self._new_phrase()
+
+    def _new_phrase(self):
+        return [self.rng.choice(STUB_VOCABULARY) for _ in range(self.rng.randint(3, 8))]
+
+    def SetWords(self, enabled):
+        pass
+
+    def AcceptWaveform(self, data):
+        samples = len(data) // 2
+        time.sleep(samples / self.rate * STUB_ASR_RTF)
+        self.fed += samples
+        return self.fed - self.phrase_start >= STUB_PHRASE_SECONDS * self.rate
+
+    def PartialResult(self):
+        progress = (self.fed - self.phrase_start) / (STUB_PHRASE_SECONDS * self.rate)
+        return json.dumps({"partial": " ".join(self.words[:int(len(self.words) * min(progress, 1.0))])})
+
+    def Result(self):
+        start = self.phrase_start / self.rate
+        step = (self.fed - self.phrase_start) / self.rate / len(self.words)
+        result = {
+            "text": " ".join(self.words),
+            "result": [{"word": w, "start": start + i * step, "end": start + (i + 0.8) * step, "conf": 1.0}
+                       for i, w in enumerate(self.words)],
+        }
+        self.phrase_start = self.fed
+        self.words = self._new_phrase()
+        return json.dumps(result)
+
+    def FinalResult(self):
+        if self.fed == self.phrase_start:
+            return json.dumps({"text": ""})
+        return self.Result()
+
+
+class StubDetoxify:
+    """Detoxify stand-in: toxic iff the text contains a STUB_TOXIC word"""
+
+    def predict(self, texts):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        time.sleep(STUB_SCORE_SECONDS[0] + STUB_SCORE_SECONDS[1] * len(texts))
+        scores = [0.95 if STUB_TOXIC & set(t.lower().split()) else 0.02 for t in texts]
+        return {"toxicity": scores[0] if single else scores}
+
+
+class SynthesisSink:
+    """
+    Audio output stand-in: synthesizes each segment (stub delay, or the
+    configured part3 engine with real=True) and discards the audio.
+    """
+
+    def __init__(self, real=False):
+        self.real = real
+        self.segments = 0
+
+    def speak(self, censored_text, trace):
+        import part3
+        tracing.mark(trace, "tts_start")
+        for kind, text in part3.split_censored(censored_text):
+            if kind == "speech":
+                if self.real:
+                    part3.synthesize(text)
+                else:
+                    time.sleep(len(text) * STUB_TTS_SECONDS_PER_CHAR)
+                self.segments += 1
+            tracing.mark(trace, "playback_start")
+
+
+def wav_chunks(path, chunk=CHUNK):
+    """Yield CHUNK-frame int16 mono byte strings from a 16 kHz WAV file."""
+    with wave.open(path, "rb") as wav_file:
+        if (wav_file.getframerate(), wav_file.getnchannels(), wav_file.getsampwidth()) != (RATE, 1, 2):
+            raise ValueError(f"{path}: expected 16 kHz mono 16-bit PCM")
+        while True:
+            data = wav_file.readframes(chunk)
+            if not data:
+                return
+            yield data.ljust(chunk * 2, b"\0")
+
+
+def synthetic_chunks(seconds=60.0, seed=0, chunk=CHUNK):
+    """Yield speech-like audio: 0.5-1.5 s of near silence, then a 1-3 s noise burst, repeated."""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    produced = 0
+    while produced < seconds * RATE:
+        for loud, lo, hi in ((False, 0.5, 1.5), (True, 1.0, 3.0)):
+            for _ in range(int(rng.uniform(lo, hi) * RATE / chunk)):
+                amplitude = 4000 if loud else 60
+                yield (rng.standard_normal(chunk) * amplitude).astype(np.int16).tobytes()
+                produced += chunk
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None if unavailable)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        try:
+            import psutil
+            info = psutil.Process().memory_info()
+            return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+        except ImportError:
+            return None
+
+
+def bench_pipeline(sources, real=False, model_path=None, verbose=False):
+    """
+    Replay audio sources through part1's recognition loop, part2's scoring
+    scheduler and a synthesis sink as fast as possible.
+    sources is a list of (name, chunk iterable). Returns the metrics dict.
+    """
+    import part1
+    import part2
+
+    if not real:
+        part2._model = StubDetoxify()
+        part2.model_ready.set()
+    part2.score_cache.clear()
+    tracing.TRACING_ENABLED = True
+    tracing.reset()
+
+    sink = SynthesisSink(real)
+    speech = queue.Queue()
+    phrases = []
+    errors = []  # scoring/synthesis failures, re-raised on this thread
+    submitted = 0
+    handled = threading.Semaphore(0)  # released once per submitted phrase, ok or not
+
+    def tts_worker():
+        while True:
+            item = speech.get()
+            if item is None:
+                break
+            try:
+                sink.speak(*item)
+            except Exception as e:
+                errors.append(e)
+            tracing.finish(item[1])
+            speech.task_done()
+            handled.release()
+
+    def on_utterance(utterance):
+        nonlocal submitted
+        trace = utterance["trace"]
+        tracing.mark(trace, "filter_start")
+        submitted += 1
+        future = part2.scheduler.submit(utterance["text"], verbose=False)
+
+        def done(future):
+            if future.exception() is not None:
+                errors.append(future.exception())
+                handled.release()
+                return
+            filtered, flagged = future.result()
+            tracing.mark(trace, "filter_end")
+            phrases.append(len(flagged))
+            speech.put((filtered, trace))
+
+        future.add_done_callback(done)
+
+    worker = threading.Thread(target=tts_worker, daemon=True)
+    worker.start()
+
+    audio_samples = 0
+
+    def counted(chunks):
+        nonlocal audio_samples
+        for data in chunks:
+            audio_samples += len(data) // 2
+            yield data
+
+    started = time.perf_counter()
+    log = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with log:
+        for i, (name, chunks) in enumerate(sources):
+            recognizer = None if real else StubRecognizer(seed=i)
+            part1.start_speech_recognition(
+                lambda text: None, threading.Event(), model_path,
+                utterance_callback=on_utterance, audio_source=counted(chunks),
+                recognizer=recognizer,
+            )
+        deadline = time.monotonic() + DRAIN_TIMEOUT
+        for _ in range(submitted):
+            if not handled.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                speech.put(None)
+                raise TimeoutError(f"pipeline did not drain within {DRAIN_TIMEOUT:.0f}s")
+    wall = time.perf_counter() - started
+    speech.put(None)
+    if errors:
+        raise RuntimeError(f"{len(errors)} of {submitted} phrases failed") from errors[0]
+
+    audio_seconds = audio_samples / RATE
+    return {
+        "sources": len(sources),
+        "stub_backends": not real,
+        "audio_s": round(audio_seconds, 3),
+        "wall_s": round(wall, 3),
+        "rtf": round(wall / audio_seconds, 4) if audio_seconds else None,
+        "phrases": len(phrases),
+        "phrases_per_s": round(len(phrases) / wall, 2) if wall else None,
+        "flagged_words": sum(phrases),
+        "peak_rss_mb": round(peak_rss_mb(), 1) if peak_rss_mb() is not None else None,
+        "stages": tracing.snapshot(),
+    }
+
+
+def compare_results(current, baseline, tolerance=0.15):
+    """
+    Compare two bench_pipeline results. Returns a list of regressions:
+    RTF and stage p95 may not grow, phrases/s may not shrink, by more
+    than tolerance (relative). Stage changes under COMPARE_MIN_DELTA_MS
+    are never regressions.
+    """
+    checks = [("rtf", current.get("rtf"), baseline.get("rtf"), False),
+              ("phrases_per_s", current.get("phrases_per_s"), baseline.get("phrases_per_s"), True)]
+    for stage, stats in current.get("stages", {}).items():
+        base = baseline.get("stages", {}).get(stage)
+        if base and stats["count"] and base["count"]:
+            checks.append((f"{stage}.p95_ms", stats["p95_ms"], base["p95_ms"], False))
+
+    regressions = []
+    for name, now, before, higher_is_better in checks:
+        if not now or not before:
+            continue
+        change = (now - before) / before
+        worse = change < -tolerance if higher_is_better else change > tolerance
+        if name.endswith("_ms") and abs(now - before) < COMPARE_MIN_DELTA_MS:
+            worse = False
+        print(f"{'❌' if worse else '✅'} {name:24} {before:>10.3f} -> {now:>10.3f} ({change:+.1%})")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EchoClean benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    startup = sub.add_parser("startup", help="time until the GUI window appears")
+    startup.add_argument("--runs", type=int, default=5)
+    startup.add_argument("--max-seconds", type=float, default=None,
+                         help="exit non-zero if the median window time exceeds this")
+
+    pipe = sub.add_parser("pipeline", help="replay audio through ASR, scoring and TTS faster than real time")
+    pipe.add_argument("files", nargs="*", help="16 kHz mono WAV files (default: synthetic audio)")
+    pipe.add_argument("--synthetic-seconds", type=float, default=120.0)
+    pipe.add_argument("--real", action="store_true",
+                      help="use the real Vosk, Detoxify and TTS backends instead of stubs")
+    pipe.add_argument("--model", default=None, help="Vosk model directory (with --real)")
+    pipe.add_argument("-o", "--output", default=None, help="write results JSON here")
+    pipe.add_argument("--compare", default=None, help="baseline results JSON to compare against")
+    pipe.add_argument("--tolerance", type=float, default=0.15)
+    pipe.add_argument("--verbose", action="store_true", help="show pipeline output")
+
+    args = parser.parse_args()
+
+    if args.command == "startup":
+        result = bench_startup(args.runs)
+        print(json.dumps(result, indent=2))
+        if args.max_seconds is not None and result["window_s_median"] > args.max_seconds:
+            print(f"❌ Window took {result['window_s_median']:.2f}s (limit {args.max_seconds}s)")
+            sys.exit(1)
+    elif args.command == "pipeline":
+        if args.files:
+            sources = [(path, wav_chunks(path)) for path in args.files]
+        else:
+            sources = [("synthetic", synthetic_chunks(args.synthetic_seconds))]
+        metrics = bench_pipeline(sources, args.real, args.model, args.verbose)
+        result = {
+            "benchmark": "pipeline",
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "inputs": [name for name, _ in sources],
+            "metrics": metrics,
+        }
+        print(json.dumps(metrics, indent=2))
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2)
+        if args.compare:
+            with open(args.compare, encoding="utf-8") as f:
+                baseline = json.load(f)["metrics"]
+            if compare_results(metrics, baseline, args.tolerance):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
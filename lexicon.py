@@ -0,0 +1,198 @@
+# lexicon.py - Blocklist / allowlist fast path using an Aho-Corasick automaton
+import os
+import threading
+import time
+from collections import deque
+
+BLOCK = "block"
+ALLOW = "allow"
+
+# Leetspeak folding applied to both list entries and tokens
+LEET_MAP = str.maketrans({
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t",
+    "@": "a", "$": "s", "!": "i", "|": "l", "+": "t",
+})
+EDGE_PUNCTUATION = ".,!?;:'\"()[]{}"
+
+
+def normalize_token(token):
+    """Lowercase, fold leetspeak and drop separators: 'F-u(k!' -> 'fuk'."""
+    token = token.lower().strip().strip(EDGE_PUNCTUATION)
+    token = token.translate(LEET_MAP)
+    return "".join(ch for ch in token if ch.isalnum())
+
+
+class AhoCorasick:
+    """
+    Multi-pattern matcher. Built once from (pattern, payload) pairs,
+    then finds every occurrence of every pattern in one pass over the text.
+    """
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        for pattern, payload in patterns:
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append((len(pattern), payload))
+
+        # Breadth-first pass to compute failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def __len__(self):
+        return len(self._goto)
+
+    def find_all(self, text):
+        """Yield (start, end, payload) for every pattern occurrence."""
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for length, payload in self._out[state]:
+                yield i + 1 - length, i + 1, payload
+
+
+def parse_entry(line):
+    """
+    Parse one list line into (pattern, mode).
+    'word' matches the whole token, 'word*' a prefix, '*word' a suffix
+    and '*word*' anywhere inside the token.
+    """
+    line = line.split("#", 1)[0].strip()
+    if not line:
+        return None
+    starts = line.startswith("*")
+    ends = line.endswith("*") and len(line) > 1
+    pattern = normalize_token(line.strip("*"))
+    if not pattern:
+        return None
+    if starts and ends:
+        mode = "any"
+    elif ends:
+        mode = "prefix"
+    elif starts:
+        mode = "suffix"
+    else:
+        mode = "exact"
+    return pattern, mode
+
+
+def _read_entries(path):
+    if not path or not os.path.exists(path):
+        return []
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            entry = parse_entry(line)
+            if entry:
+                entries.append(entry)
+    return entries
+
+
+def _mode_matches(mode, start, end, length):
+    if mode == "exact":
+        return start == 0 and end == length
+    if mode == "prefix":
+        return start == 0
+    if mode == "suffix":
+        return end == length
+    return True
+
+
+class Lexicon:
+    """
+    Compiled blocklist/allowlist.
+    classify(token) returns BLOCK, ALLOW or None (unknown, ask the model).
+    An allowlist match that covers a blocklist match overrides it,
+    e.g. allow '*class*' stops a '*ass*' entry firing inside 'classic'.
+    """
+
+    def __init__(self, blocklist_path=None, allowlist_path=None):
+        self.blocklist_path = blocklist_path
+        self.allowlist_path = allowlist_path
+        self._automaton = AhoCorasick([])
+        self._mtimes = None
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+        self.counts = {BLOCK: 0, ALLOW: 0, "unknown": 0}
+        self.reload()
+
+    def _file_mtimes(self):
+        mtimes = []
+        for path in (self.blocklist_path, self.allowlist_path):
+            try:
+                mtimes.append(os.path.getmtime(path) if path else None)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def reload(self):
+        """Rebuild the automaton from the list files and swap it in."""
+        with self._reload_lock:
+            mtimes = self._file_mtimes()
+            blocked = _read_entries(self.blocklist_path)
+            allowed = _read_entries(self.allowlist_path)
+            patterns = [(p, (BLOCK, mode)) for p, mode in blocked]
+            patterns += [(p, (ALLOW, mode)) for p, mode in allowed]
+            self._automaton = AhoCorasick(patterns)
+            self._mtimes = mtimes
+            self.size = len(patterns)
+        if self.size:
+            print(f" Lexicon loaded: {len(blocked)} blocked, {len(allowed)} allowed terms")
+        return self.size
+
+    def reload_if_changed(self, min_interval=2.0):
+        """Reload when either list file changed (checked at most every min_interval s)."""
+        now = time.monotonic()
+        if now - self._last_check < min_interval:
+            return False
+        self._last_check = now
+        if self._file_mtimes() == self._mtimes:
+            return False
+        self.reload()
+        return True
+
+    def classify(self, token):
+        """Return BLOCK, ALLOW or None for a single token."""
+        automaton = self._automaton  # read once; reload() may swap it
+        text = normalize_token(token)
+        if not text or not self.size:
+            self.counts["unknown"] += 1
+            return None
+
+        blocks, allows = [], []
+        for start, end, (kind, mode) in automaton.find_all(text):
+            if _mode_matches(mode, start, end, len(text)):
+                (blocks if kind == BLOCK else allows).append((start, end))
+
+        for b_start, b_end in blocks:
+            if not any(a_start <= b_start and b_end <= a_end for a_start, a_end in allows):
+                self.counts[BLOCK] += 1
+                return BLOCK
+        if allows:
+            self.counts[ALLOW] += 1
+            return ALLOW
+        self.counts["unknown"] += 1
+        return None
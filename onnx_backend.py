@@ -0,0 +1,178 @@
+# onnx_backend.py - ONNX Runtime CPU backend for the Detoxify classifier
+import os
+import sys
+import json
+import argparse
+import numpy as np
+
+DEFAULT_MODEL_DIR = "detoxify-onnx"
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+CLASSES_FILE = "classes.json"
+
+# Words and phrases used for the parity check (clean and toxic on purpose)
+PARITY_SAMPLES = [
+    "hello", "okay", "yeah", "the", "thanks", "idiot", "stupid", "damn",
+    "shut up", "you are an idiot", "have a nice day", "this is garbage",
+    "i will find you", "what the hell", "great job everyone", "go to hell",
+]
+
+
+def export_onnx(model_dir=DEFAULT_MODEL_DIR, variant="original", quantize=True):
+    """
+    Export a Detoxify model to ONNX (plus tokenizer and class names)
+    and optionally write an int8 dynamically-quantized copy.
+    """
+    import torch
+    from detoxify import Detoxify
+
+    os.makedirs(model_dir, exist_ok=True)
+    detox = Detoxify(variant, device="cpu")
+    detox.model.eval()
+
+    class Logits(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask)[0]
+
+    dummy = detox.tokenizer(["export sample text"], return_tensors="pt", padding=True)
+    fp32_path = os.path.join(model_dir, FP32_FILE)
+    print(f" Exporting Detoxify '{variant}' to {fp32_path}...")
+    torch.onnx.export(
+        Logits(detox.model),
+        (dummy["input_ids"], dummy["attention_mask"]),
+        fp32_path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"},
+        },
+        opset_version=14,
+    )
+
+    detox.tokenizer.save_pretrained(model_dir)
+    with open(os.path.join(model_dir, CLASSES_FILE), "w") as f:
+        json.dump(list(detox.class_names), f)
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        int8_path = os.path.join(model_dir, INT8_FILE)
+        print(f" Quantizing to int8: {int8_path}...")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    print(" ONNX export done.")
+    return model_dir
+
+
+class OnnxDetoxify:
+    """
+    Drop-in replacement for Detoxify.predict() running on ONNX Runtime.
+    Returns {class_name: score} for a string, {class_name: [scores]} for a list.
+    """
+
+    def __init__(self, model_dir=DEFAULT_MODEL_DIR, quantized=True, intra_op_threads=2):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_file = INT8_FILE if quantized else FP32_FILE
+        model_path = os.path.join(model_dir, model_file)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"{model_path} not found - run: python onnx_backend.py export"
+            )
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            model_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        with open(os.path.join(model_dir, CLASSES_FILE)) as f:
+            self.class_names = json.load(f)
+
+    def predict(self, text):
+        single = isinstance(text, str)
+        texts = [text] if single else list(text)
+
+        inputs = self.tokenizer(texts, return_tensors="np", truncation=True, padding=True)
+        feed = {name: inputs[name].astype(np.int64) for name in self.input_names}
+        logits = self.session.run(None, feed)[0]
+        scores = 1.0 / (1.0 + np.exp(-logits))
+
+        results = {}
+        for i, name in enumerate(self.class_names):
+            column = [float(s) for s in scores[:, i]]
+            results[name] = column[0] if single else column
+        return results
+
+
+def check_parity(model_dir=DEFAULT_MODEL_DIR, variant="original", quantized=True,
+                 tolerance=0.05, samples=None):
+    """
+    Score samples with the PyTorch and ONNX backends and compare toxicity.
+    Returns (max_abs_diff, threshold_flips, rows).
+    """
+    from detoxify import Detoxify
+    from part2 import TOXIC_THRESHOLD
+
+    samples = samples or PARITY_SAMPLES
+    torch_scores = Detoxify(variant, device="cpu").predict(samples)["toxicity"]
+    onnx_scores = OnnxDetoxify(model_dir, quantized=quantized).predict(samples)["toxicity"]
+
+    rows, flips = [], 0
+    for text, t_score, o_score in zip(samples, torch_scores, onnx_scores):
+        diff = abs(float(t_score) - float(o_score))
+        if (t_score > TOXIC_THRESHOLD) != (o_score > TOXIC_THRESHOLD):
+            flips += 1
+        rows.append((text, float(t_score), float(o_score), diff))
+        status = "✅" if diff <= tolerance else "❌"
+        print(f"{status} {text!r:28} torch={t_score:.4f} onnx={o_score:.4f} diff={diff:.4f}")
+
+    max_diff = max(row[3] for row in rows)
+    print(f"\nMax abs diff: {max_diff:.4f} (tolerance {tolerance}), threshold flips: {flips}")
+    return max_diff, flips, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detoxify ONNX Runtime backend")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export", help="export Detoxify to ONNX")
+    export.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    export.add_argument("--variant", default="original")
+    export.add_argument("--no-quantize", action="store_true")
+
+    parity = sub.add_parser("parity", help="compare ONNX scores with PyTorch")
+    parity.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    parity.add_argument("--variant", default="original")
+    parity.add_argument("--fp32", action="store_true", help="check the unquantized model")
+    parity.add_argument("--tolerance", type=float, default=0.05)
+    parity.add_argument("--samples", help="file with one text per line")
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_onnx(args.model_dir, args.variant, quantize=not args.no_quantize)
+    elif args.command == "parity":
+        samples = None
+        if args.samples:
+            with open(args.samples, encoding="utf-8") as f:
+                samples = [line.strip() for line in f if line.strip()]
+        max_diff, flips, _ = check_parity(
+            args.model_dir, args.variant, quantized=not args.fp32,
+            tolerance=args.tolerance, samples=samples
+        )
+        if max_diff > args.tolerance or flips:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
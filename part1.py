@@ -1,13 +1,57 @@
 # part1.py — Final Tuned Version (Accurate + Small Model)
 import os
 import json
-import queue
 import threading
 import time
 import zipfile
 import urllib.request
+import wave
+from collections import OrderedDict, deque
+import numpy as np
 import pyaudio
 import speech_recognition as sr
+import tracing
+
+MAX_LOADED_MODELS = 2  # Vosk models kept in memory at once (least recently used is released)
+
+CAPTURE_BUFFER_CHUNKS = 20  # depth of the mic -> recognizer ring buffer
+FILE_CHUNK_FRAMES = 4000    # frames per read when recognizing audio files
+
+# Voice activity detection in front of the recognizer
+VAD_ENABLED = True
+VAD_THRESHOLD_RATIO = 3.0   # speech when RMS > noise floor * ratio
+VAD_MIN_RMS = 150.0         # ...and above this absolute RMS (int16 scale)
+VAD_HANGOVER_MS = 600       # keep feeding this long after speech stops
+VAD_PREROLL_MS = 300        # audio replayed from before speech onset
+
+# Seconds of recognizer audio kept for audio-domain censorship
+AUDIO_HISTORY_SECONDS = 30
+UTTERANCE_PADDING = 0.15  # seconds of audio kept around the first/last word
+
+# Incremental filtering: hand words to partial_callback once they are stable
+INCREMENTAL_FILTERING = True
+PARTIAL_STABILITY = 2  # consecutive partial hypotheses a word must survive unchanged
+
+# Adaptive control of live recognition: mic chunk size and Vosk model tier
+ADAPTIVE_CONTROL = True
+MODEL_TIERS = (  # fastest first; only tiers present locally are switched between
+    ("small", "vosk-model-small-en-us-0.15"),
+    ("lgraph", "vosk-model-en-us-0.22-lgraph"),
+    ("full", "vosk-model-en-us-0.22"),
+)
+CHUNK_SIZES = (1024, 2048, 4096)  # frames per mic read, smallest (lowest latency) first
+CONTROL_WINDOW_SECONDS = 3.0  # decoded audio per measurement window
+RTF_LAG = 0.7               # decode time / audio time above this is falling behind
+RTF_HEADROOM = 0.2          # ...below this leaves room for a bigger model
+LAG_FILL = 0.5              # capture ring this full (fraction of depth) is falling behind
+CONTROL_SUSTAIN = 3         # consecutive lagging/spare windows before a model switch
+MODEL_SWITCH_COOLDOWN = 30.0  # seconds between model switches
+MODEL_RETRY_SECONDS = 300.0   # a tier that lagged isn't tried again for this long
+
+# Process-wide Vosk model registry: model path -> loaded Model
+_vosk_models = OrderedDict()
+_vosk_lock = threading.Lock()
+_vosk_loading = {}  # model path -> lock held while that model loads
 
 
 def download_vosk_model():
@@ -46,27 +90,628 @@ def find_vosk_model():
     return None
 
 
-def start_speech_recognition(callback, stop_flag=None):
+class CaptureRingBuffer:
     """
-    Continuously listens to microphone and sends recognized text
-    to the provided callback(text) function.
+    Preallocated ring of fixed-size audio slots between the mic thread and
+    the recognizer. read() hands out a memoryview into the ring (no copy).
+    Overflow (oldest chunk dropped because the reader fell behind) and
+    underrun (no audio arrived within the read timeout) are counted.
+    Each slot remembers when it was written; after read(), captured_at is
+    the time.perf_counter() at which the returned chunk arrived.
+    """
+
+    def __init__(self, chunk_bytes, depth=CAPTURE_BUFFER_CHUNKS):
+        self.chunk_bytes = chunk_bytes
+        self.depth = depth
+        self.buffer = bytearray(chunk_bytes * depth)
+        self.view = memoryview(self.buffer)
+        self.lengths = [0] * depth
+        self.times = [0.0] * depth
+        self.captured_at = None
+        self.write_count = 0
+        self.read_count = 0
+        self.reading = 0  # 1 while the reader holds a view into the ring
+        self.closed = False  # no more writes (file sources): read() stops waiting
+        self.cond = threading.Condition()
+
+        self.overflows = 0
+        self.underruns = 0
+        self.max_fill = 0
+
+    def write(self, data, block=False):
+        """
+        Copy one chunk into the next slot. When full, the oldest unread chunk
+        is dropped - or this one, if the next slot is still held by the reader.
+        With block=True (replayed audio) it waits for a free slot instead.
+        Chunks larger than a slot raise ValueError rather than being cut.
+        """
+        if len(data) > self.chunk_bytes:
+            raise ValueError(f"chunk of {len(data)} bytes exceeds the {self.chunk_bytes}-byte ring slot")
+        with self.cond:
+            while block and not self.closed and \
+                    self.write_count - self.read_count + self.reading >= self.depth:
+                self.cond.wait()
+            if self.write_count - self.read_count + self.reading >= self.depth:
+                self.overflows += 1
+                if self.overflows == 1:
+                    print("\n⚠️ Capture overflow: recognizer is falling behind, dropping audio")
+                if self.reading:
+                    return
+                self.read_count += 1
+
+            slot = self.write_count % self.depth
+            start = slot * self.chunk_bytes
+            n = len(data)
+            self.view[start:start + n] = data
+            self.lengths[slot] = n
+            self.times[slot] = time.perf_counter()
+            self.write_count += 1
+            self.max_fill = max(self.max_fill, self.write_count - self.read_count)
+            self.cond.notify()
+
+    def read(self, timeout=0.5):
+        """
+        Return a memoryview of the oldest unread chunk, or None on timeout.
+        The view stays valid until the next read().
+        """
+        with self.cond:
+            self.reading = 0
+            if self.write_count == self.read_count:
+                if self.closed:
+                    return None
+                self.cond.wait(timeout)
+                if self.write_count == self.read_count:
+                    if not self.closed:
+                        self.underruns += 1
+                    return None
+
+            slot = self.read_count % self.depth
+            start = slot * self.chunk_bytes
+            self.read_count += 1
+            self.reading = 1
+            self.captured_at = self.times[slot]
+            self.cond.notify_all()  # wake a blocking writer
+            return self.view[start:start + self.lengths[slot]]
+
+    def close(self):
+        """Mark the end of the audio; read() returns None once drained."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def available(self):
+        with self.cond:
+            return self.write_count - self.read_count
+
+    def stats(self):
+        with self.cond:
+            return {
+                "depth": self.depth,
+                "chunks_written": self.write_count,
+                "overflows": self.overflows,
+                "underruns": self.underruns,
+                "max_fill": self.max_fill,
+            }
+
+
+def _waveform_adapter():
+    """
+    Return a function that passes a memoryview to KaldiRecognizer.AcceptWaveform
+    without copying (Vosk's cffi binding only takes bytes or cdata).
+    """
+    try:
+        from vosk import _ffi
+        return _ffi.from_buffer
+    except ImportError:
+        return bytes
+
+
+class EnergyVAD:
+    """
+    Energy-based voice activity detector with an adaptive noise floor.
+    Silence is gated out before the recognizer; the hangover keeps word
+    endings and the pre-roll keeps word onsets, so utterances stay intact.
+    """
+
+    def __init__(self, rate=16000, chunk=1024, threshold_ratio=VAD_THRESHOLD_RATIO,
+                 min_rms=VAD_MIN_RMS, hangover_ms=VAD_HANGOVER_MS, preroll_ms=VAD_PREROLL_MS):
+        self.rate = rate
+        self.hangover_ms = hangover_ms
+        self.preroll_ms = preroll_ms
+        self.threshold_ratio = threshold_ratio
+        self.min_rms = min_rms
+        self.preroll = deque()
+        self.set_chunk(chunk)
+        self.noise_floor = None
+        self.active = False
+        self.hangover_left = 0
+
+        self.total_chunks = 0
+        self.gated_chunks = 0
+        self.decode_time = 0.0
+        self.decoded_chunks = 0
+
+    def set_chunk(self, chunk):
+        """Re-derive the hangover and pre-roll lengths for a new chunk size (in frames)."""
+        chunk_ms = 1000.0 * chunk / self.rate
+        self.chunk = chunk
+        self.hangover_chunks = max(1, int(round(self.hangover_ms / chunk_ms)))
+        self.preroll = deque(self.preroll, maxlen=max(1, int(round(self.preroll_ms / chunk_ms))))
+
+    def is_speech(self, data):
+        samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+        rms = float(np.sqrt(np.mean(samples * samples))) if samples.size else 0.0
+
+        if self.noise_floor is None:
+            self.noise_floor = rms
+        speech = rms > max(self.min_rms, self.noise_floor * self.threshold_ratio)
+
+        # Track the floor quickly in silence, very slowly during speech
+        rate = 0.001 if speech else 0.05
+        self.noise_floor += (rms - self.noise_floor) * rate
+        return speech
+
+    def process(self, data):
+        """
+        Classify one chunk. Returns (chunks_to_feed, utterance_ended).
+        utterance_ended is True when the hangover runs out after speech.
+        """
+        self.total_chunks += 1
+
+        if self.is_speech(data):
+            chunks = []
+            if not self.active:
+                chunks = list(self.preroll)
+                self.gated_chunks -= len(chunks)  # replayed, not skipped
+            chunks.append(data)
+            self.preroll.clear()
+            self.active = True
+            self.hangover_left = self.hangover_chunks
+            return chunks, False
+
+        if self.active:
+            self.hangover_left -= 1
+            if self.hangover_left <= 0:
+                self.active = False
+                return [data], True
+            return [data], False
+
+        self.preroll.append(bytes(data))  # data may be a view into the capture ring
+        self.gated_chunks += 1
+        return [], False
+
+    def record_decode(self, seconds):
+        """Record recognizer time for one fed chunk (used to estimate CPU saved)."""
+        self.decode_time += seconds
+        self.decoded_chunks += 1
+
+    def stats(self):
+        avg_decode = self.decode_time / self.decoded_chunks if self.decoded_chunks else 0.0
+        return {
+            "total_chunks": self.total_chunks,
+            "gated_chunks": self.gated_chunks,
+            "gated_fraction": self.gated_chunks / self.total_chunks if self.total_chunks else 0.0,
+            "decode_seconds": self.decode_time,
+            "cpu_seconds_saved": avg_decode * self.gated_chunks,
+        }
+
+
+class AdaptiveController:
+    """
+    Keeps live recognition real-time. It measures the recognizer's real-time
+    factor (decode time / audio time) and the capture ring's fill over
+    windows of decoded audio. Falling behind grows the mic chunk size (fewer
+    recognizer calls) and, if it persists, steps down to a faster model tier;
+    sustained headroom does the reverse. A new model is loaded in the
+    background and swapped in at the next utterance boundary. Every switch
+    is logged and counted in stats().
+    """
+
+    def __init__(self, model_path=None, chunk=CHUNK_SIZES[0]):
+        self.tiers = [(name, path) for name, path in MODEL_TIERS if os.path.isdir(path)]
+        paths = [path for _, path in self.tiers]
+        self.model_path = model_path or find_vosk_model()
+        # Models outside MODEL_TIERS (e.g. another language) are never swapped
+        self.tier = paths.index(self.model_path) if self.model_path in paths else None
+        self.chunk_index = CHUNK_SIZES.index(chunk) if chunk in CHUNK_SIZES else 0
+        self.lock = threading.Lock()
+
+        self.window_decode = 0.0
+        self.window_audio = 0.0
+        self.window_fill = 0.0
+        self.rtf = 0.0
+        self.fill = 0.0
+        self.lag_streak = 0
+        self.spare_streak = 0
+        self.last_switch = 0.0
+        self.retry_after = {}  # tier -> monotonic time it may be tried again
+        self.loading = False
+        self.pending = None  # (tier, reason): loaded, waiting for an utterance boundary
+
+        self.model_switches = 0
+        self.chunk_changes = 0
+
+    @property
+    def chunk_frames(self):
+        return CHUNK_SIZES[self.chunk_index]
+
+    def model_name(self):
+        if self.tier is not None:
+            return self.tiers[self.tier][0]
+        return os.path.basename(os.path.normpath(self.model_path)) if self.model_path else "custom"
+
+    def record(self, decode_seconds, audio_seconds, fill):
+        """Account one decoded chunk; fill is the capture ring's fill fraction."""
+        with self.lock:
+            self.window_decode += decode_seconds
+            self.window_audio += audio_seconds
+            self.window_fill = max(self.window_fill, fill)
+            if self.window_audio < CONTROL_WINDOW_SECONDS:
+                return
+            self.rtf = self.window_decode / self.window_audio
+            self.fill = self.window_fill
+            self.window_decode = self.window_audio = self.window_fill = 0.0
+            self._evaluate()
+
+    def _evaluate(self):
+        lagging = self.rtf > RTF_LAG or self.fill >= LAG_FILL
+        spare = self.rtf < RTF_HEADROOM and self.fill < LAG_FILL / 4
+        self.lag_streak = self.lag_streak + 1 if lagging else 0
+        self.spare_streak = self.spare_streak + 1 if spare else 0
+        reason = f"RTF {self.rtf:.2f}, queue {self.fill:.0%}"
+
+        if lagging and self.chunk_index < len(CHUNK_SIZES) - 1:
+            self._set_chunk(self.chunk_index + 1, reason)
+        elif spare and self.chunk_index > 0:
+            self._set_chunk(self.chunk_index - 1, reason)
+
+        now = time.monotonic()
+        if self.tier is None or self.loading or self.pending is not None:
+            return
+        if now - self.last_switch < MODEL_SWITCH_COOLDOWN:
+            return
+        if self.lag_streak >= CONTROL_SUSTAIN and self.tier > 0:
+            self.retry_after[self.tier] = now + MODEL_RETRY_SECONDS
+            self._prepare(self.tier - 1, reason)
+        elif self.spare_streak >= CONTROL_SUSTAIN and self.tier < len(self.tiers) - 1 \
+                and now >= self.retry_after.get(self.tier + 1, 0.0):
+            self._prepare(self.tier + 1, reason)
+
+    def _set_chunk(self, index, reason):
+        print(f"\n🎛️ Chunk size {self.chunk_frames} -> {CHUNK_SIZES[index]} frames ({reason})")
+        self.chunk_index = index
+        self.chunk_changes += 1
+
+    def _prepare(self, tier, reason):
+        """Load the model for `tier` in the background (called with the lock held)."""
+        name, path = self.tiers[tier]
+        print(f"\n🎛️ Loading {name} model for a switch ({reason})")
+        self.loading = True
+
+        def load():
+            try:
+                get_vosk_model(path)
+                with self.lock:
+                    self.pending = (tier, reason)
+            except Exception as e:
+                print(f"\n⚠️ Could not load {name} model: {e}")
+                with self.lock:
+                    self.retry_after[tier] = time.monotonic() + MODEL_RETRY_SECONDS
+            finally:
+                with self.lock:
+                    self.loading = False
+
+        threading.Thread(target=load, daemon=True).start()
+
+    def take_switch(self):
+        """
+        Call at an utterance boundary. Returns the model path to switch to,
+        or None if no switch is ready.
+        """
+        with self.lock:
+            if self.pending is None:
+                return None
+            tier, reason = self.pending
+            self.pending = None
+            print(f"\n🎛️ ASR model {self.model_name()} -> {self.tiers[tier][0]} ({reason})")
+            self.tier = tier
+            self.model_path = self.tiers[tier][1]
+            self.model_switches += 1
+            self.last_switch = time.monotonic()
+            self.lag_streak = self.spare_streak = 0
+            return self.model_path
+
+    def stats(self):
+        with self.lock:
+            return {
+                "model": self.model_name(),
+                "chunk_frames": self.chunk_frames,
+                "rtf": round(self.rtf, 3),
+                "queue_fill": round(self.fill, 3),
+                "model_switches_total": self.model_switches,
+                "chunk_changes_total": self.chunk_changes,
+            }
+
+
+class StablePrefixTracker:
+    """
+    Tracks the stable prefix of Vosk partial hypotheses: the words that
+    were identical in the last `stability` partials. update() returns the
+    words that became stable since the previous call; if the recognizer
+    revises an already stable word, the revised words are returned again.
+    """
+
+    def __init__(self, stability=PARTIAL_STABILITY):
+        self.stability = stability
+        self.recent = deque(maxlen=stability)
+        self.stable = []
+
+    def update(self, partial):
+        self.recent.append(partial.split())
+        if len(self.recent) < self.stability:
+            return []
+
+        prefix = []
+        for words in zip(*self.recent):
+            if any(w != words[0] for w in words):
+                break
+            prefix.append(words[0])
+
+        # Keep what was already stable unless the recognizer revised it
+        same = 0
+        while same < min(len(prefix), len(self.stable)) and prefix[same] == self.stable[same]:
+            same += 1
+        if len(prefix) <= len(self.stable) and same == len(prefix):
+            return []
+        self.stable = prefix
+        return prefix[same:]
+
+    def reset(self):
+        self.recent.clear()
+        self.stable = []
+
+
+class PcmHistory:
+    """
+    Ring buffer of the most recent int16 audio fed to the recognizer,
+    addressed by absolute sample index. Vosk word timestamps count from
+    the recognizer's creation, so call restart() when a new recognizer
+    takes over mid-stream.
+    """
+
+    def __init__(self, seconds=AUDIO_HISTORY_SECONDS, rate=16000):
+        self.rate = rate
+        self.buffer = np.zeros(int(seconds * rate), dtype=np.int16)
+        self.total = 0  # samples written since the start
+        self.origin = 0  # sample index where the current recognizer's clock started
+
+    def restart(self):
+        """Word times of a recognizer created now count from the current position."""
+        self.origin = self.total
+
+    def append(self, data):
+        samples = np.frombuffer(data, dtype=np.int16)
+        capacity = len(self.buffer)
+        if len(samples) > capacity:
+            self.total += len(samples) - capacity
+            samples = samples[-capacity:]
+
+        pos = self.total % capacity
+        first = min(len(samples), capacity - pos)
+        self.buffer[pos:pos + first] = samples[:first]
+        self.buffer[:len(samples) - first] = samples[first:]
+        self.total += len(samples)
+
+    def get(self, start, end):
+        """Return a copy of samples [start, end) that are still buffered."""
+        start = max(start, self.total - len(self.buffer), 0)
+        end = min(end, self.total)
+        if end <= start:
+            return np.zeros(0, dtype=np.int16)
+        return self.buffer[np.arange(start, end) % len(self.buffer)]
+
+    def utterance(self, text, words):
+        """
+        Cut the audio for one final result.
+        Returns {"text", "words", "pcm", "rate"} with word times relative to pcm.
+        """
+        base = self.origin / self.rate
+        first = max(base + words[0]["start"] - UTTERANCE_PADDING, 0.0)
+        last = base + words[-1]["end"] + UTTERANCE_PADDING
+        start = int(first * self.rate)
+        pcm = self.get(start, int(last * self.rate))
+
+        # Samples lost to the ring buffer shift the start forward
+        offset = max(start, self.total - len(self.buffer)) / self.rate
+        rel_words = [
+            {"word": w["word"], "start": base + w["start"] - offset, "end": base + w["end"] - offset}
+            for w in words
+        ]
+        return {"text": text, "words": rel_words, "pcm": pcm, "rate": self.rate}
+
+
+def get_vosk_model(model_path=None):
     """
-    from vosk import Model, KaldiRecognizer
+    Return the shared Vosk Model for model_path, loading it once per process.
+    Defaults to the first local model (downloading the small one if none).
+    """
+    from vosk import Model
+
+    model_path = model_path or find_vosk_model() or download_vosk_model()
+    with _vosk_lock:
+        model = _vosk_models.get(model_path)
+        if model is not None:
+            _vosk_models.move_to_end(model_path)
+            return model
+        load_lock = _vosk_loading.setdefault(model_path, threading.Lock())
+
+    # Load outside the registry lock: other models stay available meanwhile,
+    # and concurrent callers for this path wait for the one load
+    with load_lock:
+        with _vosk_lock:
+            model = _vosk_models.get(model_path)
+        if model is None:
+            print(f" Loading Vosk model: {model_path}")
+            model = Model(model_path)
+        with _vosk_lock:
+            _vosk_models[model_path] = model
+            _vosk_models.move_to_end(model_path)
+            _vosk_loading.pop(model_path, None)
+            while len(_vosk_models) > MAX_LOADED_MODELS:
+                old_path, _ = _vosk_models.popitem(last=False)
+                print(f" Released Vosk model: {old_path}")
+    return model
+
 
-    model_path = find_vosk_model() or download_vosk_model()
-    model = Model(model_path)
+def preload_vosk_model(model_path=None):
+    """Load a local Vosk model on a background thread (never downloads)."""
+    model_path = model_path or find_vosk_model()
+    if not model_path:
+        return None
 
-    recognizer = KaldiRecognizer(model, 16000)
+    def load():
+        try:
+            get_vosk_model(model_path)
+        except Exception as e:
+            print(f" Vosk preload failed: {e}")
+
+    thread = threading.Thread(target=load, daemon=True)
+    thread.start()
+    return thread
+
+
+def release_vosk_models(keep=0):
+    """
+    Drop least recently used models until at most `keep` remain, e.g. under
+    memory pressure. Running recognizers keep their own model reference.
+    Returns the number of models released.
+    """
+    released = 0
+    with _vosk_lock:
+        while len(_vosk_models) > keep:
+            old_path, _ = _vosk_models.popitem(last=False)
+            print(f" Released Vosk model: {old_path}")
+            released += 1
+    return released
+
+
+def create_recognizer(model_path=None, rate=16000):
+    """Create a fresh KaldiRecognizer on the shared model (cheap once loaded)."""
+    from vosk import KaldiRecognizer
+
+    recognizer = KaldiRecognizer(get_vosk_model(model_path), rate)
     recognizer.SetWords(True)
     recognizer.SetMaxAlternatives(0)
+    return recognizer
+
+
+def pcm_to_int16(data, width):
+    """Convert little-endian PCM of 1-4 bytes per sample (8-bit unsigned) to int16 bytes."""
+    if width == 1:
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.int16) - 128) << 8
+    elif width == 3:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+        samples = (raw[:, 2].astype(np.int8).astype(np.int16) << 8) | raw[:, 1]
+    elif width == 4:
+        samples = np.frombuffer(data, dtype="<i4") >> 16
+    else:
+        raise ValueError(f"unsupported WAV sample width: {width} bytes")
+    return samples.astype(np.int16).tobytes()
+
+
+def stream_wav_results(path, model_path=None, chunk_frames=FILE_CHUNK_FRAMES, stop_event=None):
+    """
+    Recognize a WAV file incrementally: frames are read in fixed-size chunks
+    and fed to a KaldiRecognizer, and every final Vosk result (dict with
+    "text" and per-word "result") is yielded as soon as it is recognized.
+    Only one chunk is in memory at a time, whatever the file length.
+    8-, 24- and 32-bit PCM is converted to 16-bit as it is read.
+    """
+    with wave.open(path, "rb") as wav_file:
+        if wav_file.getcomptype() != "NONE":
+            raise ValueError("only uncompressed PCM WAV files are supported")
+        width = wav_file.getsampwidth()
+        channels = wav_file.getnchannels()
+        recognizer = create_recognizer(model_path, wav_file.getframerate())
+
+        while stop_event is None or not stop_event.is_set():
+            data = wav_file.readframes(chunk_frames)
+            if not data:
+                break
+            if width != 2:
+                data = pcm_to_int16(data, width)
+            if channels > 1:
+                samples = np.frombuffer(data, dtype=np.int16).reshape(-1, channels)
+                data = samples.mean(axis=1).astype(np.int16).tobytes()
+
+            if recognizer.AcceptWaveform(data):
+                result = json.loads(recognizer.Result())
+                if result.get("text", "").strip():
+                    yield result
+
+        result = json.loads(recognizer.FinalResult())
+        if result.get("text", "").strip():
+            yield result
+
+
+def start_speech_recognition(callback, stop_flag=None, model_path=None, vad=None,
+                             utterance_callback=None, partial_callback=None,
+                             audio_source=None, recognizer=None, controller=None):
+    """
+    Continuously listens to microphone and sends recognized text
+    to the provided callback(text) function.
+    Pass an EnergyVAD as `vad` to read its gating stats afterwards.
+    If utterance_callback is given it is called instead of callback, as
+    utterance_callback(utterance) with the dict from PcmHistory.utterance()
+    (text, per-word timings and the original audio) plus its latency
+    "trace" (see tracing.py) and "captured", the time.perf_counter() at
+    which its first audio frame was captured.
+    With INCREMENTAL_FILTERING, partial_callback(words, trace) receives
+    words from the partial hypotheses as soon as they are stable, so they
+    can be scored before the speaker pauses.
+    For replay (tests, benchmark.py) pass audio_source, an iterable of
+    int16 mono 16 kHz chunks of at most 1024 frames: no mic is opened, chunks are fed as fast as
+    the recognizer takes them without dropping any, and the call returns
+    once all of the audio has been processed. `recognizer` replaces the
+    Vosk recognizer (anything with the KaldiRecognizer methods).
+    With ADAPTIVE_CONTROL, live recognition is tuned by an
+    AdaptiveController (pass one as `controller` to read its stats).
+    """
+    if recognizer is None:
+        model_path = model_path or find_vosk_model() or download_vosk_model()
+        recognizer = create_recognizer(model_path, 16000)
+        if controller is None and ADAPTIVE_CONTROL and audio_source is None:
+            controller = AdaptiveController(model_path)
+    if controller is not None:
+        tracing.register_collector("asr_controller", controller.stats)
 
     RATE = 16000
     CHUNK = 1024             
-    audio_q = queue.Queue(maxsize=20)  
+    slot_frames = max(CHUNK_SIZES) if controller is not None else CHUNK
+    ring = CaptureRingBuffer(slot_frames * 2, CAPTURE_BUFFER_CHUNKS)  # int16 mono
+    to_waveform = _waveform_adapter()
     stop_event = stop_flag if stop_flag is not None else threading.Event()
+    if vad is None and VAD_ENABLED:
+        vad = EnergyVAD(RATE, CHUNK)
+    history = PcmHistory(AUDIO_HISTORY_SECONDS, RATE) if utterance_callback else None
+    tracker = StablePrefixTracker() if partial_callback and INCREMENTAL_FILTERING else None
+
+    source_errors = []
+
+    def source_producer():
+        """Feed replayed audio into the ring buffer, waiting when it is full."""
+        try:
+            for data in audio_source:
+                if stop_event.is_set():
+                    break
+                ring.write(data, block=True)
+        except Exception as e:
+            source_errors.append(e)  # re-raised to the caller once the consumer is done
+        finally:
+            ring.close()
 
     def audio_producer():
-        """Record audio and feed the recognition queue."""
+        """Record audio and feed the capture ring buffer."""
         p = pyaudio.PyAudio()
 
         
@@ -97,12 +742,9 @@ def start_speech_recognition(callback, stop_flag=None):
 
         while not stop_event.is_set():
             try:
-                data = stream.read(CHUNK, exception_on_overflow=False)
-                try:
-                    audio_q.put_nowait(data)
-                except queue.Full:
-                    audio_q.get_nowait()  # drop oldest
-                    audio_q.put_nowait(data)
+                frames = controller.chunk_frames if controller is not None else CHUNK
+                data = stream.read(frames, exception_on_overflow=False)
+                ring.write(data)
             except Exception as e:
                 if not stop_event.is_set():
                     print(f"Audio read error: {e}")
@@ -114,48 +756,151 @@ def start_speech_recognition(callback, stop_flag=None):
 
     def recognizer_consumer():
         """Process audio chunks using Vosk recognizer."""
+        nonlocal recognizer
         last_partial = ""
         confidence_threshold = 0.35  # lower to accept more short phrases
 
-        while not stop_event.is_set() or not audio_q.empty():
-            try:
-                data = audio_q.get(timeout=0.5)
-            except queue.Empty:
+        def handle_final(result_json):
+            nonlocal last_partial, utterance_started, utterance_captured, trace
+            if utterance_started is None:
+                trace = tracing.start()
+            tracing.mark(trace, "asr_final")
+            captured = utterance_captured if utterance_started is not None else time.perf_counter()
+            utterance_started = None
+            if tracker is not None:
+                tracker.reset()
+            result = json.loads(result_json)
+            text = result.get("text", "").strip()
+
+            if text:
+                result_dict = result.get("result", [])
+                if result_dict:
+                    avg_conf = sum(w.get("conf", 1.0) for w in result_dict) / len(result_dict)
+                    if avg_conf < confidence_threshold:
+                        print(f"\r⚠️ Low confidence ({avg_conf:.2f}), skipped", end="", flush=True)
+                        return
+
+                # Send text to callback (GUI handler)
+                if utterance_callback and result_dict:
+                    utterance = history.utterance(text, result_dict)
+                    utterance["trace"] = trace
+                    utterance["captured"] = captured
+                    utterance_callback(utterance)
+                else:
+                    callback(text)
+                last_partial = ""
+                print()  # newline
+                if audio_source is None:
+                    time.sleep(0.1)  # balance producer-consumer timing
+
+        in_utterance = False  # audio fed since the last final result
+        utterance_started = None  # when the first chunk of this phrase was fed
+        utterance_captured = None  # when its first audio frame was captured (perf_counter)
+        trace = None  # latency trace of the current phrase (see tracing.py)
+
+        while not stop_event.is_set() or ring.available():
+            data = ring.read(timeout=0.5)
+            if data is None:
+                if ring.closed:
+                    break
                 continue
 
             if stop_event.is_set():
                 break
 
-            if recognizer.AcceptWaveform(data):
-                result = json.loads(recognizer.Result())
-                text = result.get("text", "").strip()
+            if controller is not None:
+                # Nothing fed since the last final result: safe to change models
+                if not in_utterance:
+                    switch_to = controller.take_switch()
+                    if switch_to:
+                        recognizer = create_recognizer(switch_to, RATE)
+                        if history is not None:
+                            history.restart()
+                if vad is not None and len(data) // 2 != vad.chunk:
+                    vad.set_chunk(len(data) // 2)
 
-                if text:
-                    result_dict = result.get("result", [])
-                    if result_dict:
-                        avg_conf = sum(w.get("conf", 1.0) for w in result_dict) / len(result_dict)
-                        if avg_conf < confidence_threshold:
-                            print(f"\r⚠️ Low confidence ({avg_conf:.2f}), skipped", end="", flush=True)
-                            continue
-
-                    # Send text to callback (GUI handler)
-                    callback(text)
-                    last_partial = ""
-                    print()  # newline
-                    time.sleep(0.1)  # balance producer-consumer timing
+            if vad is not None:
+                chunks, utterance_ended = vad.process(data)
             else:
-                partial = json.loads(recognizer.PartialResult()).get("partial", "")
-                if partial and partial != last_partial:
-                    print(f"\r🎤 {partial}...", end="", flush=True)
-                    last_partial = partial
+                chunks, utterance_ended = [data], False
+
+            # When each chunk's first frame was captured: the ring stamps the
+            # end of `data`; pre-roll chunks are the contiguous audio before it
+            captured = ring.captured_at
+            frame_times = []
+            for chunk in reversed(chunks):
+                captured -= len(chunk) / 2 / RATE
+                frame_times.append(captured)
+            frame_times.reverse()
+
+            for chunk, captured in zip(chunks, frame_times):
+                if history is not None:
+                    history.append(chunk)
+                start = time.perf_counter()
+                if utterance_started is None:
+                    utterance_started = start
+                    utterance_captured = captured
+                    trace = tracing.start(capture=captured, audio_start=start)
+                is_final = recognizer.AcceptWaveform(to_waveform(chunk))
+                elapsed = time.perf_counter() - start
+                if vad is not None:
+                    vad.record_decode(elapsed)
+                if controller is not None:
+                    controller.record(elapsed, len(chunk) / 2 / RATE, ring.available() / ring.depth)
+
+                if is_final:
+                    in_utterance = False
+                    handle_final(recognizer.Result())
+                else:
+                    in_utterance = True
+                    partial = json.loads(recognizer.PartialResult()).get("partial", "")
+                    if partial and partial != last_partial:
+                        print(f"\r🎤 {partial}...", end="", flush=True)
+                        last_partial = partial
+                        if tracker is not None:
+                            stable_words = tracker.update(partial)
+                            if stable_words:
+                                partial_callback(stable_words, trace)
+
+            # Silence gated after speech: close the utterance explicitly
+            if utterance_ended and in_utterance:
+                in_utterance = False
+                handle_final(recognizer.FinalResult())
+
+        # Replayed audio ended mid-utterance: flush it like a pause would
+        if audio_source is not None and in_utterance:
+            handle_final(recognizer.FinalResult())
+        ring.close()  # release a replay producer blocked on a full ring
+
+        ring_stats = ring.stats()
+        print(f"\n🎚️ Capture: {ring_stats['overflows']} chunks dropped (overflow), "
+              f"{ring_stats['underruns']} underruns, peak fill {ring_stats['max_fill']}/{ring_stats['depth']}")
+        if vad is not None:
+            stats = vad.stats()
+            print(f"🔇 VAD gated {stats['gated_fraction']:.0%} of audio, "
+                  f"saved ~{stats['cpu_seconds_saved']:.1f}s of decoding")
+        if controller is not None:
+            stats = controller.stats()
+            print(f"🎛️ Adaptive control: {stats['model']} model, {stats['chunk_frames']}-frame chunks, "
+                  f"{stats['model_switches_total']} model switches, {stats['chunk_changes_total']} chunk changes")
 
     # Launch producer and consumer threads
-    producer_thread = threading.Thread(target=audio_producer, daemon=True)
+    producer_thread = threading.Thread(
+        target=audio_producer if audio_source is None else source_producer, daemon=True
+    )
     consumer_thread = threading.Thread(target=recognizer_consumer, daemon=True)
 
     producer_thread.start()
     consumer_thread.start()
 
+    if audio_source is not None:
+        consumer_thread.join()
+        producer_thread.join()
+        stop_event.set()
+        if source_errors:
+            raise source_errors[0]
+        return stop_event
+
     print("\n🎙️ Listening... Speak now!\n" + "-" * 60)
 
     if stop_flag is None:
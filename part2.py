@@ -1,11 +1,356 @@
 # part2.py
-from detoxify import Detoxify
+import os
+import gzip
+import json
+import time
+import atexit
+import bisect
+import tempfile
+import threading
+from concurrent.futures import Future
+from collections import OrderedDict
+from lexicon import Lexicon, BLOCK, ALLOW
 
-print(" Loading Detoxify model (first time may take a few seconds)...")
-model = Detoxify("original")
-print(" Detoxify model loaded successfully.")
+MODEL_VARIANT = "original"
+UNCASED_VARIANTS = {"original"}  # bert-base-uncased: lowercasing doesn't change the score
+
+# Scorer backend: "torch" (Detoxify/PyTorch) or "onnx" (ONNX Runtime, see onnx_backend.py)
+SCORER_BACKEND = "torch"
+ONNX_MODEL_DIR = "detoxify-onnx"
+ONNX_QUANTIZED = True   # use the int8 model written by `onnx_backend.py export`
+ONNX_THREADS = 2        # ONNX Runtime intra-op threads
+
+# The model is loaded on first use (or by warm_up()), not at import
+_model = None
+_model_lock = threading.Lock()
+model_ready = threading.Event()
+
+
+def get_model():
+    """Return the toxicity model for SCORER_BACKEND, loading it on first call."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                print(f" Loading Detoxify model ({model_tag()}, first time may take a few seconds)...")
+                if SCORER_BACKEND == "onnx":
+                    from onnx_backend import OnnxDetoxify
+                    _model = OnnxDetoxify(ONNX_MODEL_DIR, quantized=ONNX_QUANTIZED,
+                                          intra_op_threads=ONNX_THREADS)
+                else:
+                    from detoxify import Detoxify
+                    _model = Detoxify(MODEL_VARIANT)
+                model_ready.set()
+                print(" Detoxify model loaded successfully.")
+    return _model
+
+
+def model_tag():
+    """Identify the model variant and backend (backends differ slightly in scores)."""
+    if SCORER_BACKEND == "onnx":
+        return f"{MODEL_VARIANT}/onnx-{'int8' if ONNX_QUANTIZED else 'fp32'}"
+    return MODEL_VARIANT
+
+
+def warm_up():
+    """Load the model on a background thread. Check model_ready for completion."""
+    def load():
+        try:
+            get_model()
+        except Exception as e:
+            print(f" Detoxify warm-up failed: {e}")
+
+    thread = threading.Thread(target=load, daemon=True)
+    thread.start()
+    return thread
 
 TOXIC_THRESHOLD = 0.75
+MAX_BATCH_SIZE = 64  # words per Detoxify forward pass (bounds padded batch memory)
+SCORE_CACHE_SIZE = 20000  # max cached word scores (LRU)
+SCORE_CACHE_FILE = None   # e.g. "toxicity_cache.json.gz" to start warm after restarts
+
+# Phrase-first mode: score whole phrases first and only drill down to
+# word-level scoring for phrases above PHRASE_THRESHOLD.
+PHRASE_FIRST = False
+PHRASE_THRESHOLD = 0.2
+
+# Word lists checked before the model ('word', 'word*', '*word', '*word*' per line)
+BLOCKLIST_FILE = "blocklist.txt"
+ALLOWLIST_FILE = "allowlist.txt"
+LEXICON_RELOAD_INTERVAL = 2.0  # seconds between list file change checks
+
+lexicon = Lexicon(BLOCKLIST_FILE, ALLOWLIST_FILE)
+
+
+def reload_lexicon():
+    """Rebuild the blocklist/allowlist matcher from disk."""
+    return lexicon.reload()
+
+
+class ScoreCache:
+    """
+    Thread-safe LRU cache of per-word toxicity scores.
+    Keys are (model tag, normalized word), see model_tag().
+    """
+
+    def __init__(self, maxsize=SCORE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            score = self._data.get(key)
+            if score is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return score
+
+    def put(self, key, score):
+        with self._lock:
+            self._data[key] = score
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def save(self, path):
+        """Write entries (oldest first) to a gzipped JSON file."""
+        with self._lock:
+            entries = [[tag, word, round(score, 6)]
+                       for (tag, word), score in self._data.items()]
+        # A temp file per writer: concurrent saves can't interleave into one
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".",
+                                        prefix=os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+                json.dump(entries, f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self, path):
+        """
+        Load entries saved by save(), keeping the newest maxsize of them.
+        Returns the number loaded. Trimming doesn't count as evictions.
+        """
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            entries = json.load(f)[-self.maxsize:] if self.maxsize > 0 else []
+        with self._lock:
+            for tag, word, score in entries:
+                self._data[(tag, word)] = float(score)
+                self._data.move_to_end((tag, word))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return len(entries)
+
+
+score_cache = ScoreCache()
+
+
+def load_score_cache(path=None):
+    """Warm the score cache from disk (defaults to SCORE_CACHE_FILE)."""
+    path = path or SCORE_CACHE_FILE
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        count = score_cache.load(path)
+        print(f" Loaded {count} cached toxicity scores from {path}")
+        return count
+    except Exception as e:
+        print(f" Score cache load skipped: {e}")
+        return 0
+
+
+def save_score_cache(path=None):
+    """Persist the score cache to disk (defaults to SCORE_CACHE_FILE)."""
+    path = path or SCORE_CACHE_FILE
+    if not path:
+        return
+    try:
+        score_cache.save(path)
+    except Exception as e:
+        print(f" Score cache save failed: {e}")
+
+
+def cache_stats():
+    """Return hit/miss/eviction counters of the word score cache."""
+    return score_cache.stats()
+
+
+load_score_cache()
+atexit.register(save_score_cache)
+
+
+_phrase_lock = threading.Lock()
+_phrase_counts = {"phrases": 0, "short_circuited": 0}
+
+
+def phrase_stats():
+    """Return how many phrases phrase-first mode scored and short-circuited."""
+    with _phrase_lock:
+        stats = dict(_phrase_counts)
+    stats["short_circuit_rate"] = (
+        stats["short_circuited"] / stats["phrases"] if stats["phrases"] else 0.0
+    )
+    return stats
+
+
+def _normalize(word):
+    """Normalize a word into its score cache form."""
+    word = word.strip()
+    if MODEL_VARIANT in UNCASED_VARIANTS:
+        word = word.lower()
+    return word
+
+
+def _predict(texts):
+    """Run Detoxify over texts in batches of MAX_BATCH_SIZE."""
+    scores = []
+    for start in range(0, len(texts), MAX_BATCH_SIZE):
+        batch = texts[start:start + MAX_BATCH_SIZE]
+        scores.extend(float(s) for s in get_model().predict(batch)["toxicity"])
+    return scores
+
+
+def score_phrases(texts):
+    """Score whole phrases (uncached) and return their toxicity scores."""
+    return _predict(list(texts))
+
+
+def score_words(words):
+    """
+    Score a list of words with Detoxify.
+    Cached words skip the model; the rest are sent as padded
+    batches of at most MAX_BATCH_SIZE.
+    Returns a list of toxicity scores in the same order.
+    """
+    tag = model_tag()
+    scores = [None] * len(words)
+    positions = {}  # normalized word -> positions in words
+    for i, word in enumerate(words):
+        positions.setdefault(_normalize(word), []).append(i)
+
+    pending = []
+    for key, idxs in positions.items():
+        cached = score_cache.get((tag, key))
+        if cached is None:
+            pending.append(key)
+        else:
+            for i in idxs:
+                scores[i] = cached
+
+    for key, tox_score in zip(pending, _predict(pending)):
+        score_cache.put((tag, key), tox_score)
+        for i in positions[key]:
+            scores[i] = tox_score
+    return scores
+
+
+def _censor_words(words, scores):
+    """
+    Replace words scoring above TOXIC_THRESHOLD with ****.
+    Returns (filtered_words, flagged) with flagged as (index, word, score).
+    """
+    filtered_words, flagged = [], []
+    for i, word in enumerate(words):
+        tox_score = scores.get(word, 0.0)  # unscored: cleared by phrase-first
+        if tox_score > TOXIC_THRESHOLD:
+            filtered_words.append("****")
+            flagged.append((i, word, round(tox_score, 3)))
+        else:
+            filtered_words.append(word)
+    return filtered_words, flagged
+
+
+def analyze_toxicity_batch(texts, verbose=True):
+    """
+    Detect and censor toxic words in several phrases at once.
+    Blocklisted words are censored and allowlisted words kept without
+    the model. The remaining distinct words across the phrases are
+    scored together, so a burst of phrases costs one batched model call.
+    With PHRASE_FIRST, phrases scoring at or below PHRASE_THRESHOLD
+    skip word-level scoring (only lexicon matches are censored).
+    Returns (cleaned_text, flagged) per phrase, flagged being a list of
+    (word index, word, score).
+    """
+    split_texts = [text.split() if text.strip() else [] for text in texts]
+    unique_words = list(dict.fromkeys(w for words in split_texts for w in words))
+
+    # Lexicon fast path: blocklisted words are censored and allowlisted
+    # words are kept without ever reaching the model.
+    lexicon.reload_if_changed(LEXICON_RELOAD_INTERVAL)
+    scores = {}
+    for word in unique_words:
+        verdict = lexicon.classify(word)
+        if verdict == BLOCK:
+            scores[word] = 1.0
+        elif verdict == ALLOW:
+            scores[word] = 0.0
+
+    clean = set()  # indexes of phrases cleared by phrase-first scoring
+    if PHRASE_FIRST:
+        candidates = [i for i, words in enumerate(split_texts)
+                      if any(w not in scores for w in words)]
+        phrase_scores = score_phrases(texts[i] for i in candidates)
+        clean = {i for i, score in zip(candidates, phrase_scores) if score <= PHRASE_THRESHOLD}
+        with _phrase_lock:
+            _phrase_counts["phrases"] += len(candidates)
+            _phrase_counts["short_circuited"] += len(clean)
+
+    unknown = list(dict.fromkeys(
+        w for i, words in enumerate(split_texts) if i not in clean
+        for w in words if w not in scores
+    ))
+    scores.update(zip(unknown, score_words(unknown)))
+
+    results = []
+    for text, words in zip(texts, split_texts):
+        if not words:
+            results.append((text, []))
+            continue
+
+        filtered_words, flagged = _censor_words(words, scores)
+
+        if verbose:
+            if flagged:
+                print(f"🚫 Toxic words: {[(word, score) for _, word, score in flagged]}")
+            else:
+                print("✅ Clean text.")
+
+        results.append((" ".join(filtered_words), flagged))
+    return results
+
+
+def filter_toxicity_batch(texts):
+    """
+    Detect and censor toxic words in several phrases at once
+    (see analyze_toxicity_batch). Returns the cleaned phrases in order.
+    """
+    return [filtered for filtered, _ in analyze_toxicity_batch(texts)]
+
 
 def filter_toxicity(text):
     """
@@ -15,20 +360,122 @@ def filter_toxicity(text):
     if not text.strip():
         return text
 
-    words = text.split()
-    filtered_words, flagged = [], []
+    return filter_toxicity_batch([text])[0]
 
-    for word in words:
-        tox_score = float(model.predict(word)["toxicity"])
-        if tox_score > TOXIC_THRESHOLD:
-            filtered_words.append("****")
-            flagged.append((word, round(tox_score, 3)))
-        else:
-            filtered_words.append(word)
 
-    if flagged:
-        print(f"🚫 Toxic words: {flagged}")
-    else:
-        print("✅ Clean text.")
+# Central scoring scheduler: phrases from every producer (live mic, file
+# upload, server sessions) are collected and scored together.
+SCHEDULER_MAX_BATCH = 16     # phrases per analyze_toxicity_batch call
+SCHEDULER_MAX_WAIT = 0.015   # seconds the oldest queued phrase may wait for company
+WAIT_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class ScoringScheduler:
+    """
+    Deadline-aware micro-batcher in front of analyze_toxicity_batch.
+    submit() queues a phrase and returns a Future. A dispatcher thread
+    sends a batch as soon as SCHEDULER_MAX_BATCH phrases are waiting or
+    the oldest one has waited SCHEDULER_MAX_WAIT, whichever comes first.
+    Each Future resolves to that phrase's (cleaned_text, flagged).
+    """
+
+    def __init__(self, max_batch=SCHEDULER_MAX_BATCH, max_wait=SCHEDULER_MAX_WAIT):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._pending = []  # (enqueued_at, text, verbose, future)
+        self._cond = threading.Condition()
+        self._thread = None
+        self.max_depth = 0
+        self.batches = 0
+        self.batch_sizes = {}  # batch size -> count
+        self.wait_hist = [0] * (len(WAIT_BUCKETS_MS) + 1)  # last bucket: overflow
+
+    def submit(self, text, verbose=True):
+        """Queue a phrase for scoring. Returns a concurrent.futures.Future."""
+        future = Future()
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name="scoring-scheduler")
+                self._thread.start()
+            self._pending.append((time.monotonic(), text, verbose, future))
+            self.max_depth = max(self.max_depth, len(self._pending))
+            self._cond.notify()
+        return future
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                deadline = self._pending[0][0] + self.max_wait
+                remaining = deadline - time.monotonic()
+                if len(self._pending) >= self.max_batch or remaining <= 0:
+                    batch = self._pending[:self.max_batch]
+                    del self._pending[:self.max_batch]
+                    return batch
+                self._cond.wait(remaining)
+
+    def _run(self):
+        while True:
+            # Claim the futures first: ones the caller already cancelled are skipped
+            batch = [item for item in self._next_batch() if item[3].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.monotonic()
+            self._record(batch, started)
+            try:
+                results = analyze_toxicity_batch([text for _, text, _, _ in batch],
+                                                 verbose=any(v for _, _, v, _ in batch))
+            except Exception as e:
+                results = [e] * len(batch)
+            for (_, _, _, future), result in zip(batch, results):
+                try:
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+                except Exception as e:
+                    # One bad result must not kill the dispatcher every caller relies on
+                    print(f"⚠️ Scheduler could not resolve a phrase: {e}")
+
+    def _record(self, batch, started):
+        with self._cond:
+            self.batches += 1
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+            for enqueued_at, _, _, _ in batch:
+                self.wait_hist[bisect.bisect_left(WAIT_BUCKETS_MS, 1000 * (started - enqueued_at))] += 1
+
+    def stats(self):
+        """Queue depth plus batch-size and wait-time (ms) histograms."""
+        with self._cond:
+            labels = [f"<={b}" for b in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}"]
+            phrases = sum(size * n for size, n in self.batch_sizes.items())
+            return {
+                "queue_depth": len(self._pending),
+                "max_queue_depth": self.max_depth,
+                "batches": self.batches,
+                "phrases": phrases,
+                "mean_batch_size": phrases / self.batches if self.batches else 0.0,
+                "batch_size_hist": dict(sorted(self.batch_sizes.items())),
+                "wait_ms_hist": dict(zip(labels, self.wait_hist)),
+            }
+
+
+scheduler = ScoringScheduler()
+
+
+def filter_toxicity_scheduled(text):
+    """
+    Like filter_toxicity, but batched with phrases from other threads
+    through the shared scheduler. Blocks until the result is ready.
+    """
+    if not text.strip():
+        return text
+    return scheduler.submit(text).result()[0]
+
 
-    return " ".join(filtered_words)
+def scheduler_stats():
+    """Return the scoring scheduler's queue and batching statistics."""
+    return scheduler.stats()
@@ -1,123 +1,474 @@
-# part3.py - Google TTS with pygame beeps
+# part3.py - Google TTS / offline Piper TTS with beeps on a persistent output stream
+import io
 import re
+import time
 import numpy as np
 from gtts import gTTS
 import pygame
-import tempfile
-import os
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import tracing
 
-# Initialize pygame mixer
-pygame.mixer.init(frequency=22050, size=-16, channels=2, buffer=512)
+MIXER_SETTINGS = dict(frequency=22050, size=-16, channels=2, buffer=512)  # MP3 decoding only
+OUTPUT_RATE = 22050
+OUTPUT_BUFFER = 512  # frames per output callback (~23 ms): cancel latency
+BEEP_FREQUENCY = 800
+AUDIO_BEEP_LEVEL = 0.5  # beep amplitude over censored words in the original audio
 
-def generate_beep_sound(duration=0.3, frequency=800, sample_rate=22050):
-    """Generate beep sound as WAV file for pygame"""
-    t = np.linspace(0, duration, int(sample_rate * duration))
+# TTS engine: "gtts" (Google, needs internet) or "piper" (offline neural voice)
+TTS_ENGINE = "gtts"
+PIPER_VOICE = "en_US-lessac-medium.onnx"  # Piper voice model (.onnx + .onnx.json)
+
+TTS_WORKERS = 2          # segments synthesized in parallel while earlier ones play
+SPLICE_SEGMENTS = False  # render speech + beeps into one buffer before playing
+MAX_PREFETCHED = 8       # sentences synthesized ahead of playback
+
+# The mixer, output stream and TTS engine are created on first use
+# (or by warm_up()), not at import
+_init_lock = threading.Lock()
+_output = None
+_tts_engine = None
+_tts_pool = None
+_prefetched = OrderedDict()  # sentence -> deque of per-part future lists
+_prefetch_lock = threading.Lock()
+audio_ready = threading.Event()
+
+
+class OutputEngine:
+    """
+    One persistent PyAudio output stream. The audio callback pulls frames
+    from an in-memory queue of int16 buffers, so cancel/flush take effect
+    within one buffer period without reopening the device.
+    """
+
+    def __init__(self, rate=OUTPUT_RATE, frames_per_buffer=OUTPUT_BUFFER):
+        self.rate = rate
+        self.frames_per_buffer = frames_per_buffer
+        self.generation = 0  # bumped by cancel(); stale playback is rejected
+        self._queue = deque()  # [seq, samples, position]
+        self._next_seq = 0
+        self._status = OrderedDict()  # seq -> "queued" / "done" / "cancelled"
+        self._cond = threading.Condition()
+        self._pa = None
+        self._stream = None
+
+    def start(self):
+        import pyaudio
+        self._continue = pyaudio.paContinue  # read by the callback
+        self._pa = pyaudio.PyAudio()
+        self._stream = self._pa.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self.rate,
+            output=True,
+            frames_per_buffer=self.frames_per_buffer,
+            stream_callback=self._callback,
+            start=False
+        )
+        self._stream.start_stream()
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        out = np.zeros(frame_count, dtype=np.int16)
+        filled = 0
+        with self._cond:
+            while filled < frame_count and self._queue:
+                entry = self._queue[0]
+                seq, samples, pos = entry
+                n = min(frame_count - filled, len(samples) - pos)
+                out[filled:filled + n] = samples[pos:pos + n]
+                filled += n
+                entry[2] = pos + n
+                if entry[2] >= len(samples):
+                    self._queue.popleft()
+                    if seq in self._status:
+                        self._status[seq] = "done"
+                    self._cond.notify_all()
+        return out.tobytes(), self._continue
+
+    def play(self, pcm, rate, generation=None):
+        """
+        Queue mono int16 PCM. Returns a sequence number for wait(), or None
+        if `generation` is stale (playback was cancelled meanwhile).
+        """
+        samples = _resample(pcm, rate, self.rate)
+        with self._cond:
+            if generation is not None and generation != self.generation:
+                return None
+            seq = self._next_seq
+            self._next_seq += 1
+            if len(samples):
+                self._queue.append([seq, samples, 0])
+                self._status[seq] = "queued"
+            else:
+                self._status[seq] = "done"
+            while len(self._status) > 256:  # buffers nobody waited for
+                self._status.popitem(last=False)
+            return seq
+
+    def wait(self, seq):
+        """Block until buffer `seq` has played. Returns False if it was cancelled."""
+        if seq is None:
+            return False
+        with self._cond:
+            while self._status.get(seq) == "queued":
+                self._cond.wait(0.5)
+            return self._status.pop(seq, "done") == "done"
+
+    def cancel(self):
+        """Stop immediately: drop the playing buffer and everything queued."""
+        with self._cond:
+            self._drop(keep=0)
+            self.generation += 1
+            self._cond.notify_all()
+
+    def flush(self):
+        """Drop queued buffers but let the one currently playing finish."""
+        with self._cond:
+            self._drop(keep=1)
+            self._cond.notify_all()
+
+    def _drop(self, keep):
+        """Cancel queued buffers after the first `keep` (caller holds the lock)."""
+        while len(self._queue) > keep:
+            seq = self._queue.pop()[0]
+            if seq in self._status:
+                self._status[seq] = "cancelled"
+
+    def barge_in(self, pcm, rate):
+        """Cut off whatever is playing and play pcm right away."""
+        self.cancel()
+        return self.play(pcm, rate)
+
+    def busy(self):
+        with self._cond:
+            return bool(self._queue)
+
+    def close(self):
+        self.cancel()
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._pa.terminate()
+            self._stream = None
+
+
+def ensure_mixer():
+    """Initialize the pygame mixer (used to decode gTTS MP3s) if it isn't running."""
+    if not pygame.mixer.get_init():
+        with _init_lock:
+            if not pygame.mixer.get_init():
+                pygame.mixer.init(**MIXER_SETTINGS)
+
+
+def get_output():
+    """Return the shared output engine, opening the stream on first call."""
+    global _output
+    if _output is None:
+        with _init_lock:
+            if _output is None:
+                output = OutputEngine()
+                output.start()
+                _output = output
+    return _output
+
+
+def stop_playback():
+    """Cancel current and queued playback and any synthesis ahead."""
+    cancel_prefetch()
+    if _output is not None:
+        _output.cancel()
+
+
+def warm_up():
+    """Open the output stream and load the TTS engine on a background thread. Check audio_ready."""
+    def init():
+        try:
+            get_output()
+            get_tts_engine()
+            audio_ready.set()
+        except Exception as e:
+            print(f" Audio warm-up failed: {e}")
+
+    thread = threading.Thread(target=init, daemon=True)
+    thread.start()
+    return thread
+
+def beep_wave(n_samples, frequency=800, sample_rate=22050):
+    """Beep tone as a float array in [-1, 1] with 10 ms fade in/out"""
+    t = np.arange(n_samples) / sample_rate
     wave = np.sin(2 * np.pi * frequency * t)
     
     # Apply fade in/out
-    fade_len = int(sample_rate * 0.01)
-    wave[:fade_len] *= np.linspace(0, 1, fade_len)
-    wave[-fade_len:] *= np.linspace(1, 0, fade_len)
-    
-    # Convert to 16-bit integers
-    audio = (wave * 32767).astype(np.int16)
-    
-    # Save as temporary WAV file
-    import wave
-    beep_file = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
-    with wave.open(beep_file.name, 'w') as wav_file:
-        wav_file.setnchannels(1)
-        wav_file.setsampwidth(2)
-        wav_file.setframerate(sample_rate)
-        wav_file.writeframes(audio.tobytes())
-    
-    return beep_file.name
+    fade_len = min(int(sample_rate * 0.01), n_samples // 2)
+    if fade_len:
+        wave[:fade_len] *= np.linspace(0, 1, fade_len)
+        wave[-fade_len:] *= np.linspace(1, 0, fade_len)
+    return wave
 
-# Pre-generate beep file
-BEEP_FILE = generate_beep_sound()
+def _resample(pcm, src_rate, dst_rate):
+    """Linear-interpolation resample of mono int16 audio"""
+    pcm = np.asarray(pcm, dtype=np.int16)
+    if src_rate == dst_rate or len(pcm) == 0:
+        return pcm
+    n_out = int(round(len(pcm) * dst_rate / src_rate))
+    positions = np.linspace(0, len(pcm) - 1, n_out)
+    return np.interp(positions, np.arange(len(pcm)), pcm).astype(np.int16)
 
-def play_beep_fast():
-    """Play beep sound using pygame"""
+# Pre-rendered beep, played straight from memory
+BEEP_PCM = (beep_wave(int(OUTPUT_RATE * 0.3), BEEP_FREQUENCY, OUTPUT_RATE) * 32767).astype(np.int16)
+
+def play_pcm(pcm, rate, generation=None):
+    """
+    Play mono int16 PCM on the output stream and wait for it.
+    Returns False if playback was cancelled (or generation is stale).
+    """
+    output = get_output()
+    return output.wait(output.play(pcm, rate, generation))
+
+def play_beep_fast(generation=None):
+    """Play the pre-rendered beep"""
     try:
-        beep = pygame.mixer.Sound(BEEP_FILE)
-        beep.play()
-        pygame.time.wait(300)  # Wait for beep to finish
+        return play_pcm(BEEP_PCM, OUTPUT_RATE, generation)
     except Exception as e:
         print(f"Beep error: {e}")
+        return True
+
+def censored_spans(utterance, filtered_text):
+    """(start, end) times of the words part2 replaced with ****"""
+    return [
+        (word["start"], word["end"])
+        for word, filtered in zip(utterance["words"], filtered_text.split())
+        if filtered == "****"
+    ]
+
+def censor_audio(pcm, rate, spans, level=AUDIO_BEEP_LEVEL):
+    """Return a copy of int16 pcm with each (start, end) span replaced by the beep tone"""
+    out = np.array(pcm, dtype=np.int16, copy=True)
+    for start, end in spans:
+        a = max(int(start * rate), 0)
+        b = min(int(end * rate), len(out))
+        if b > a:
+            out[a:b] = (beep_wave(b - a, BEEP_FREQUENCY, rate) * level * 32767).astype(np.int16)
+    return out
 
-def speak_censored_text(censored_sentence):
+def speak_censored_audio(utterance, filtered_text, trace=None):
     """
-    Speak text with natural human voice using Google TTS
+    Play the speaker's original audio with the censored words beeped out.
+    utterance is the dict produced by part1 (text, word timings, pcm, rate).
+    """
+    tracing.mark(trace, "tts_start")
+    spans = censored_spans(utterance, filtered_text)
+    pcm = censor_audio(utterance["pcm"], utterance["rate"], spans)
+    
+    print("\n Playing original audio...", end=" ", flush=True)
+    try:
+        tracing.mark(trace, "playback_start")
+        if play_pcm(pcm, utterance["rate"], get_output().generation):
+            print(" Done!")
+        else:
+            print(" Interrupted!")
+    except Exception as e:
+        print(f"\n Playback error: {e}")
+
+class GTTSEngine:
+    """Google TTS; the MP3 is decoded in memory by the pygame mixer"""
+    
+    def synthesize(self, text):
+        mp3 = io.BytesIO()
+        gTTS(text=text, lang='en', tld='com.au', slow=False).write_to_fp(mp3)
+        mp3.seek(0)
+        
+        ensure_mixer()
+        samples = pygame.sndarray.array(pygame.mixer.Sound(file=mp3))
+        if samples.ndim > 1:
+            samples = samples.mean(axis=1)
+        return samples.astype(np.int16), pygame.mixer.get_init()[0]
+
+class PiperEngine:
+    """Offline neural TTS with Piper; the voice model stays loaded"""
+    
+    def __init__(self, voice_path=PIPER_VOICE):
+        from piper import PiperVoice
+        self.voice = PiperVoice.load(voice_path)
+        self.rate = self.voice.config.sample_rate
+    
+    def synthesize(self, text):
+        if hasattr(self.voice, "synthesize_stream_raw"):  # piper-tts < 1.3
+            raw = b"".join(self.voice.synthesize_stream_raw(text))
+            return np.frombuffer(raw, dtype=np.int16), self.rate
+        chunks = [chunk.audio_int16_array for chunk in self.voice.synthesize(text)]
+        if not chunks:
+            return np.zeros(0, dtype=np.int16), self.rate
+        return np.concatenate(chunks), self.rate
+
+def get_tts_engine():
+    """Return the TTS engine for TTS_ENGINE, loading it once"""
+    global _tts_engine
+    if _tts_engine is None:
+        with _init_lock:
+            if _tts_engine is None:
+                _tts_engine = PiperEngine() if TTS_ENGINE == "piper" else GTTSEngine()
+    return _tts_engine
+
+# Per-segment synthesis timing
+synthesis_stats = {"segments": 0, "total_s": 0.0, "last_s": 0.0, "max_s": 0.0}
+_stats_lock = threading.Lock()
+
+def synthesize(text):
+    """Synthesize one text segment to (int16 mono pcm, sample rate), timing it"""
+    start = time.perf_counter()
+    pcm, rate = get_tts_engine().synthesize(text)
+    elapsed = time.perf_counter() - start
+    
+    with _stats_lock:
+        synthesis_stats["segments"] += 1
+        synthesis_stats["total_s"] += elapsed
+        synthesis_stats["last_s"] = elapsed
+        synthesis_stats["max_s"] = max(synthesis_stats["max_s"], elapsed)
+    print(f"[tts {elapsed * 1000:.0f} ms]", end=" ", flush=True)
+    return pcm, rate
+
+def split_censored(censored_sentence):
+    """Split a sentence into ("beep", None) and ("speech", text) parts"""
+    parts = []
+    for part in re.split(r'(\*+)', censored_sentence):
+        if part and re.fullmatch(r'\*+', part):
+            parts.append(("beep", None))
+        elif part.strip():
+            parts.append(("speech", part))
+    return parts
+
+def _get_pool():
+    global _tts_pool
+    if _tts_pool is None:
+        with _init_lock:
+            if _tts_pool is None:
+                _tts_pool = ThreadPoolExecutor(max_workers=TTS_WORKERS,
+                                               thread_name_prefix="tts")
+    return _tts_pool
+
+def _submit(parts):
+    """Start synthesis of every speech part; beeps get None"""
+    pool = _get_pool()
+    return [pool.submit(synthesize, text) if kind == "speech" else None
+            for kind, text in parts]
+
+def prefetch(censored_sentence):
+    """Start synthesizing a queued sentence before it is spoken"""
+    futures = _submit(split_censored(censored_sentence))
+    with _prefetch_lock:
+        _prefetched.setdefault(censored_sentence, deque()).append(futures)
+        while len(_prefetched) > MAX_PREFETCHED:
+            _, dropped = _prefetched.popitem(last=False)
+            for futs in dropped:
+                _cancel(futs)
+
+def discard_prefetched(censored_sentence):
+    """Cancel a prefetch whose sentence will not be spoken (e.g. shed by the TTS queue)"""
+    futures = _take_prefetched(censored_sentence)
+    if futures:
+        _cancel(futures)
+
+def _take_prefetched(censored_sentence):
+    with _prefetch_lock:
+        pending = _prefetched.get(censored_sentence)
+        if not pending:
+            return None
+        futures = pending.popleft()
+        if not pending:
+            del _prefetched[censored_sentence]
+        return futures
+
+def _cancel(futures):
+    for future in futures:
+        if future is not None:
+            future.cancel()
+
+def cancel_prefetch():
+    """Drop all sentences synthesized ahead (e.g. when TTS is stopped)"""
+    with _prefetch_lock:
+        for pending in _prefetched.values():
+            for futures in pending:
+                _cancel(futures)
+        _prefetched.clear()
+
+def render_censored_text(censored_sentence, futures=None):
+    """Synthesize all segments and splice them with beeps into one (pcm, rate) buffer"""
+    parts = split_censored(censored_sentence)
+    futures = futures or _submit(parts)
+    
+    pieces, rate = [], None
+    for (kind, _), future in zip(parts, futures):
+        if kind == "beep":
+            pieces.append(None)
+        else:
+            pcm, pcm_rate = future.result()
+            rate = rate or pcm_rate
+            pieces.append(_resample(pcm, pcm_rate, rate))
+    
+    rate = rate or OUTPUT_RATE
+    beep = _resample(BEEP_PCM, OUTPUT_RATE, rate)
+    buffers = [beep if piece is None else piece for piece in pieces]
+    if not buffers:
+        return np.zeros(0, dtype=np.int16), rate
+    return np.concatenate(buffers), rate
+
+def speak_censored_text(censored_sentence, trace=None):
+    """
+    Speak text with the configured TTS engine
     Replace **** with beep sounds
+    All segments are synthesized on the worker pool up front, so
+    segment N+1 is ready by the time segment N finishes playing.
     """
-    parts = re.split(r'(\*+)', censored_sentence)
+    tracing.mark(trace, "tts_start")
+    parts = split_censored(censored_sentence)
+    futures = _take_prefetched(censored_sentence) or _submit(parts)
     
+    # stop_playback() bumps the generation; later segments are then rejected
+    generation = get_output().generation
     print("\n Speaking...", end=" ", flush=True)
     
-    temp_files = []
     interrupted = False
     
     try:
-        for part in parts:
-            # Check if pygame was quit (means stop was called)
-            if not pygame.mixer.get_init():
-                interrupted = True
-                break
-            
-            if part and re.fullmatch(r'\*+', part):
-                # Play beep for censored words
-                play_beep_fast()
-            elif part.strip():
-                # Generate natural speech with Google TTS
-                tts = gTTS(text=part, lang='en', tld='com.au', slow=False)
-                
-                # Save to temporary file
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as fp:
-                    temp_file = fp.name
-                    temp_files.append(temp_file)
-                    tts.save(temp_file)
+        if SPLICE_SEGMENTS:
+            pcm, rate = render_censored_text(censored_sentence, futures)
+            tracing.mark(trace, "playback_start")
+            interrupted = not play_pcm(pcm, rate, generation)
+        else:
+            for (kind, _), future in zip(parts, futures):
+                if kind == "beep":
+                    # Play beep for censored words
+                    tracing.mark(trace, "playback_start")
+                    played = play_beep_fast(generation)
+                else:
+                    # Wait for this segment (usually already synthesized) and play it
+                    pcm, rate = future.result()
+                    tracing.mark(trace, "playback_start")
+                    played = play_pcm(pcm, rate, generation)
                 
-                # Play the audio
-                try:
-                    pygame.mixer.music.load(temp_file)
-                    pygame.mixer.music.play()
-                    
-                    # Wait for playback with interrupt detection
-                    while pygame.mixer.music.get_busy():
-                        if not pygame.mixer.get_init():
-                            interrupted = True
-                            break
-                        pygame.time.wait(100)
-                    
-                    if interrupted:
-                        break
-                        
-                except Exception as e:
-                    print(f" Error: {e}")
+                if not played:
+                    interrupted = True
                     break
         
         if interrupted:
+            _cancel(futures)
             print(" Interrupted!")
         else:
             print(" Done!")
             
     except Exception as e:
+        _cancel(futures)
         print(f"\n TTS error: {e}")
-        print("   Make sure you have internet connection for Google TTS")
-    finally:
-        # Cleanup temp files
-        for temp_file in temp_files:
-            try:
-                if os.path.exists(temp_file):
-                    os.unlink(temp_file)
-            except:
-                pass
-
-def process_and_speak(censored_text):
+        if TTS_ENGINE == "gtts":
+            print("   Make sure you have internet connection for Google TTS")
+
+def process_and_speak(censored_text, trace=None):
     """
     Main function to output censored text with natural human voice
     """
     if censored_text and censored_text.strip():
-        speak_censored_text(censored_text)
+        speak_censored_text(censored_text, trace)
     else:
         print(" No text to speak.")
\ No newline at end of file
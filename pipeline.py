@@ -0,0 +1,350 @@
+# pipeline.py - Optional multi-process pipeline: capture, ASR, scoring and output
+# each run in their own process; audio moves over a shared-memory ring buffer.
+import sys
+import json
+import time
+import queue
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+RATE = 16000
+CHUNK = 1024                # frames per mic read
+RING_CHUNKS = 64            # depth of the capture -> ASR shared-memory ring
+RING_POLL_INTERVAL = 0.005  # reader sleep while the ring is empty (chunks are 64 ms)
+SCORING_BATCH = 16          # phrases per analyze_toxicity_batch call
+SUPERVISE_INTERVAL = 0.5    # seconds between liveness checks
+MAX_RESTARTS = 5            # per stage, before the supervisor gives up on it
+RESTART_BACKOFF = 1.0       # seconds, doubled after every restart of a stage
+
+_HEADER = 3  # int64 slots: write sequence, read sequence, overflows
+
+
+class SharedAudioRing:
+    """
+    Fixed-size chunk ring in multiprocessing shared memory, for one writer
+    process and one reader process. The header (write sequence, read
+    sequence, overflow count) lives in the same block. The writer only
+    advances the write sequence and the reader only the read sequence, so
+    there are no cross-process locks: a stage that crashes mid-operation
+    can't leave the other side blocked, and the ring survives the restart.
+    The slot `depth` chunks behind the write sequence may be mid-write, so
+    a reader that falls that far behind skips ahead to the oldest safe
+    chunk and counts the skipped ones as overflows.
+    """
+
+    def __init__(self, chunk_bytes, depth=RING_CHUNKS, name=None):
+        self.chunk_bytes = chunk_bytes
+        self.depth = depth
+        self._owner = name is None
+        size = 8 * _HEADER + chunk_bytes * depth
+        self._shm = shared_memory.SharedMemory(name=name, create=self._owner, size=size)
+        self._attach()
+        if self._owner:
+            self._header[:] = 0
+
+    def _attach(self):
+        import numpy as np
+        self._header = np.ndarray((_HEADER,), dtype=np.int64, buffer=self._shm.buf)
+        self._slots = self._shm.buf[8 * _HEADER:]
+
+    def __getstate__(self):
+        # Sent to child processes: they re-attach by name
+        return {"name": self._shm.name, "chunk_bytes": self.chunk_bytes, "depth": self.depth}
+
+    def __setstate__(self, state):
+        self.chunk_bytes = state["chunk_bytes"]
+        self.depth = state["depth"]
+        self._owner = False
+        self._shm = shared_memory.SharedMemory(name=state["name"])
+        self._attach()
+
+    def write(self, data):
+        """Copy one chunk (exactly chunk_bytes) into the ring, then publish it."""
+        write_seq = int(self._header[0])
+        offset = (write_seq % self.depth) * self.chunk_bytes
+        self._slots[offset:offset + self.chunk_bytes] = data
+        self._header[0] = write_seq + 1
+
+    def read(self, timeout=None):
+        """Return the oldest chunk as bytes, or None if none arrived within timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            write_seq, read_seq = int(self._header[0]), int(self._header[1])
+            if write_seq - read_seq >= self.depth:
+                self._header[2] += write_seq - self.depth + 1 - read_seq
+                read_seq = write_seq - self.depth + 1
+                self._header[1] = read_seq
+            if read_seq < write_seq:
+                offset = (read_seq % self.depth) * self.chunk_bytes
+                data = bytes(self._slots[offset:offset + self.chunk_bytes])
+                # The writer may have lapped us during the copy: retry from the new oldest
+                if int(self._header[0]) - read_seq >= self.depth:
+                    continue
+                self._header[1] = read_seq + 1
+                return data
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(RING_POLL_INTERVAL)
+
+    def stats(self):
+        write_seq, read_seq = int(self._header[0]), int(self._header[1])
+        return {"fill": min(write_seq - read_seq, self.depth), "depth": self.depth,
+                "overflows": int(self._header[2])}
+
+    def close(self):
+        """Detach from the shared memory (and free it, in the creating process)."""
+        self._header = None
+        self._slots.release()
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+def capture_stage(ring, stop_event, ready):
+    """Mic -> shared-memory ring."""
+    import pyaudio
+
+    p = pyaudio.PyAudio()
+    stream = p.open(format=pyaudio.paInt16, channels=1, rate=RATE, input=True,
+                    frames_per_buffer=CHUNK)
+    ready.set()
+    try:
+        while not stop_event.is_set():
+            ring.write(stream.read(CHUNK, exception_on_overflow=False))
+    finally:
+        stream.stop_stream()
+        stream.close()
+        p.terminate()
+        ring.close()
+
+
+def asr_stage(ring, asr_out, stop_event, ready, model_path=None):
+    """Shared-memory ring -> Vosk (behind the VAD) -> final results queue."""
+    import part1
+
+    recognizer = part1.create_recognizer(model_path, RATE)
+    ready.set()
+    to_waveform = part1._waveform_adapter()
+    vad = part1.EnergyVAD(RATE, CHUNK) if part1.VAD_ENABLED else None
+    in_utterance = False
+
+    def emit(result_json):
+        result = json.loads(result_json)
+        if result.get("text", "").strip():
+            asr_out.put({"text": result["text"], "result": result.get("result", []),
+                         "asr_at": time.time()})
+
+    try:
+        while not stop_event.is_set():
+            data = ring.read(timeout=0.5)
+            if data is None:
+                continue
+            chunks, utterance_ended = vad.process(data) if vad is not None else ([data], False)
+            for chunk in chunks:
+                if recognizer.AcceptWaveform(to_waveform(chunk)):
+                    in_utterance = False
+                    emit(recognizer.Result())
+                else:
+                    in_utterance = True
+            if utterance_ended and in_utterance:
+                in_utterance = False
+                emit(recognizer.FinalResult())
+    finally:
+        ring.close()
+
+
+def scoring_stage(asr_out, results, speech, stop_event, ready):
+    """Final results -> batched toxicity filtering -> GUI results and speech queues."""
+    import part2
+
+    part2.get_model()
+    ready.set()
+    while not stop_event.is_set():
+        try:
+            batch = [asr_out.get(timeout=0.5)]
+        except queue.Empty:
+            continue
+        while len(batch) < SCORING_BATCH:
+            try:
+                batch.append(asr_out.get_nowait())
+            except queue.Empty:
+                break
+
+        analyzed = part2.analyze_toxicity_batch([item["text"] for item in batch], verbose=False)
+        for item, (filtered, flagged) in zip(batch, analyzed):
+            results.put({"text": item["text"], "filtered": filtered,
+                         "flagged": [(word, score) for _, word, score in flagged],
+                         "asr_at": item["asr_at"], "scored_at": time.time()})
+            if filtered.strip():
+                speech.put(filtered)
+
+
+def output_stage(speech, stop_event, flush_event, ready):
+    """Filtered text -> TTS with beeps; flush_event drops queued and current speech."""
+    import part3
+
+    part3.get_output()
+    ready.set()
+
+    def watch_flush():
+        while not stop_event.is_set():
+            if flush_event.wait(0.1):
+                flush_event.clear()
+                while True:
+                    try:
+                        speech.get_nowait()
+                    except queue.Empty:
+                        break
+                part3.stop_playback()
+
+    threading.Thread(target=watch_flush, daemon=True).start()
+    while not stop_event.is_set():
+        try:
+            text = speech.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        part3.process_and_speak(text)
+
+
+class Pipeline:
+    """
+    Runs the capture, ASR, scoring and output stages as separate processes
+    and restarts any stage that dies (up to MAX_RESTARTS, with backoff).
+    Filtered phrases arrive on `results` as dicts with text, filtered,
+    flagged, asr_at and scored_at. Each stage sets its `ready` event once
+    its models or devices are loaded.
+    """
+
+    STAGES = ("capture", "asr", "scoring", "output")
+
+    def __init__(self, model_path=None, stages=STAGES, max_restarts=MAX_RESTARTS):
+        self.ctx = mp.get_context("spawn")
+        self.model_path = model_path
+        self.stage_names = tuple(stages)
+        self.max_restarts = max_restarts
+        self.ring = SharedAudioRing(CHUNK * 2, RING_CHUNKS)
+        self.asr_out = self.ctx.Queue()
+        self.results = self.ctx.Queue()
+        self.speech = self.ctx.Queue()
+        self.stop_event = self.ctx.Event()
+        self.flush_event = self.ctx.Event()
+        self.ready = {name: self.ctx.Event() for name in self.stage_names}
+        self.processes = {}
+        self.restarts = {name: 0 for name in self.stage_names}
+        self._next_start = {name: 0.0 for name in self.stage_names}
+        self._monitor = None
+
+    def _stage_args(self, name):
+        ready = self.ready[name]
+        if name == "capture":
+            return capture_stage, (self.ring, self.stop_event, ready)
+        if name == "asr":
+            return asr_stage, (self.ring, self.asr_out, self.stop_event, ready, self.model_path)
+        if name == "scoring":
+            return scoring_stage, (self.asr_out, self.results, self.speech, self.stop_event, ready)
+        return output_stage, (self.speech, self.stop_event, self.flush_event, ready)
+
+    def _start_stage(self, name):
+        self.ready[name].clear()
+        target, args = self._stage_args(name)
+        proc = self.ctx.Process(target=target, args=args, name=f"echoclean-{name}", daemon=True)
+        proc.start()
+        self.processes[name] = proc
+
+    def start(self):
+        for name in self.stage_names:
+            self._start_stage(name)
+        self._monitor = threading.Thread(target=self._supervise, daemon=True)
+        self._monitor.start()
+        print(f"🧩 Pipeline started: {', '.join(self.stage_names)}")
+        return self
+
+    def _supervise(self):
+        while not self.stop_event.wait(SUPERVISE_INTERVAL):
+            for name, proc in list(self.processes.items()):
+                if proc.is_alive() or proc.exitcode is None:
+                    continue
+                if self.restarts[name] >= self.max_restarts:
+                    if self._next_start[name] != float("inf"):
+                        print(f"❌ {name} stage failed {self.restarts[name]} times, giving up")
+                        self._next_start[name] = float("inf")
+                    continue
+                now = time.monotonic()
+                if not self._next_start[name]:
+                    self._next_start[name] = now + RESTART_BACKOFF * 2 ** self.restarts[name]
+                    print(f"⚠️ {name} stage exited (code {proc.exitcode}), restarting...")
+                if now >= self._next_start[name]:
+                    self.restarts[name] += 1
+                    self._next_start[name] = 0.0
+                    self._start_stage(name)
+
+    def flush_output(self):
+        """Stop current speech and drop everything queued for the output stage."""
+        self.flush_event.set()
+
+    def stats(self):
+        return {
+            "alive": {name: proc.is_alive() for name, proc in self.processes.items()},
+            "ready": {name: event.is_set() for name, event in self.ready.items()},
+            "restarts": dict(self.restarts),
+            "ring": self.ring.stats(),
+        }
+
+    def stop(self, timeout=3.0):
+        self.stop_event.set()
+        for proc in self.processes.values():
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.terminate()
+                proc.join(1.0)
+        self.ring.close()
+        print(f"🧩 Pipeline stopped (restarts: {self.restarts})")
+
+
+def check_ring():
+    """Read a full and an overflowed SharedAudioRing; returns True if both behave."""
+    ok = True
+    for written, expected, overflows in ((4, [1, 2, 3], 1), (10, [7, 8, 9], 7)):
+        ring = SharedAudioRing(4, depth=4)
+        try:
+            for i in range(written):
+                ring.write(bytes([i]) * 4)
+            started = time.monotonic()
+            got = []
+            while True:
+                data = ring.read(timeout=0.2)
+                if data is None:
+                    break
+                got.append(data[0])
+            elapsed = time.monotonic() - started
+            passed = (got == expected and ring.stats()["overflows"] == overflows and elapsed < 1.0)
+            print(f"{'✅' if passed else '❌'} {written} chunks into depth 4: read {got}, "
+                  f"{ring.stats()['overflows']} overflows, {elapsed:.2f}s")
+            ok = ok and passed
+        finally:
+            ring.close()
+    return ok
+
+
+def main():
+    """Run the pipeline headless and print filtered phrases."""
+    if sys.argv[1:] == ["check-ring"]:
+        sys.exit(0 if check_ring() else 1)
+    pipeline = Pipeline(model_path=sys.argv[1] if len(sys.argv) > 1 else None).start()
+    try:
+        while True:
+            try:
+                msg = pipeline.results.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            latency = (msg["scored_at"] - msg["asr_at"]) * 1000
+            print(f"{msg['text']} -> {msg['filtered']}  ({latency:.0f} ms)")
+    except KeyboardInterrupt:
+        print("\n👋 Stopping...")
+    finally:
+        pipeline.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+# server.py - Multi-session moderation server sharing one set of loaded models
+import os
+import sys
+import json
+import time
+import wave
+import asyncio
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+HOST = "127.0.0.1"
+PORT = 8765
+CLIENT_CHUNK_SECONDS = 0.25
+CLEAN_AUDIO_SECONDS = 60  # audio held per session until the phrase covering it is final
+
+# Framing: 1-byte message type + 4-byte big-endian length + payload
+MSG_HEADER = b"H"       # client -> server: JSON {"rate", "clean_audio", "name"}
+MSG_AUDIO = b"A"        # client -> server: int16 mono PCM
+MSG_END = b"E"          # client -> server: end of stream
+MSG_RESULT = b"R"       # server -> client: JSON filtered phrase
+MSG_CLEAN_AUDIO = b"C"  # server -> client: next int16 PCM of the session, censored words beeped
+MSG_STATS = b"S"        # server -> client: JSON session stats (last message)
+
+
+async def read_message(reader):
+    header = await reader.readexactly(5)
+    length = int.from_bytes(header[1:], "big")
+    payload = await reader.readexactly(length) if length else b""
+    return header[:1], payload
+
+
+def write_message(writer, kind, payload=b""):
+    writer.write(kind + len(payload).to_bytes(4, "big") + payload)
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class CleanAudio:
+    """
+    A session's audio sent back in order with censored words beeped out.
+    Audio is held until a final result covers it, then released in one
+    piece, so the client can concatenate the releases into a copy of its
+    stream. Audio that fell out of the history before its phrase was
+    final is released as silence rather than uncensored.
+    """
+
+    def __init__(self, history):
+        self.history = history  # part1.PcmHistory; word times count from its start
+        self.sent = 0  # samples released so far
+
+    def append(self, data):
+        self.history.append(data)
+
+    def release(self, spans=()):
+        """Return the PCM since the last release, with (start, end) session times beeped."""
+        from part3 import censor_audio
+
+        rate = self.history.rate
+        end = self.history.total
+        pcm = np.zeros(end - self.sent, dtype=np.int16)
+        kept = self.history.get(self.sent, end)
+        pcm[len(pcm) - len(kept):] = kept
+        offset = self.sent / rate
+        self.sent = end
+        return censor_audio(pcm, rate, [(a - offset, b - offset) for a, b in spans])
+
+
+class ModerationServer:
+    """
+    Accepts many concurrent PCM streams. Every session gets its own
+    KaldiRecognizer, but the Vosk and toxicity models are loaded once and
+    shared read-only. Decoding and scoring run on a thread pool (Vosk and
+    the models release the GIL), so sessions proceed in parallel.
+    """
+
+    def __init__(self, model_path=None, workers=None):
+        self.model_path = model_path
+        self.executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 4,
+                                           thread_name_prefix="moderation")
+        self.active = 0
+        self.peak = 0
+        self.sessions_total = 0
+
+    def preload(self):
+        """Load the shared models before accepting connections."""
+        import part1
+        import part2
+        import part3  # audio censoring; imported up front so the first session doesn't pay for it
+        part1.get_vosk_model(self.model_path)
+        part2.get_model()
+
+    async def serve(self, host=HOST, port=PORT):
+        server = await asyncio.start_server(self.handle_session, host, port)
+        print(f"🛡️ Moderation server listening on {host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    async def handle_session(self, reader, writer):
+        import part1
+
+        loop = asyncio.get_running_loop()
+        self.sessions_total += 1
+        session_id = self.sessions_total
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        print(f"🔌 Session {session_id} opened ({self.active} active, peak {self.peak})")
+
+        started = time.perf_counter()
+        latencies, audio_bytes, phrases = [], 0, 0
+        try:
+            kind, payload = await read_message(reader)
+            header = json.loads(payload) if kind == MSG_HEADER else {}
+            rate = int(header.get("rate", 16000))
+            clean = (CleanAudio(part1.PcmHistory(CLEAN_AUDIO_SECONDS, rate))
+                     if header.get("clean_audio") else None)
+
+            recognizer = await loop.run_in_executor(
+                self.executor, part1.create_recognizer, self.model_path, rate
+            )
+
+            while True:
+                kind, payload = await read_message(reader)
+                if kind == MSG_END:
+                    break
+                if kind != MSG_AUDIO:
+                    continue
+
+                received = time.perf_counter()
+                audio_bytes += len(payload)
+                if clean is not None:
+                    clean.append(payload)
+                if await loop.run_in_executor(self.executor, recognizer.AcceptWaveform, payload):
+                    if await self._emit(writer, recognizer.Result(), clean, received):
+                        phrases += 1
+                        latencies.append(time.perf_counter() - received)
+
+            received = time.perf_counter()
+            final = await loop.run_in_executor(self.executor, recognizer.FinalResult)
+            if await self._emit(writer, final, clean, received):
+                phrases += 1
+                latencies.append(time.perf_counter() - received)
+
+            audio_seconds = audio_bytes / 2 / rate
+            wall = time.perf_counter() - started
+            stats = {
+                "session": session_id,
+                "name": header.get("name"),
+                "phrases": phrases,
+                "audio_s": round(audio_seconds, 3),
+                "wall_s": round(wall, 3),
+                "latency_ms_mean": round(1000 * statistics.mean(latencies), 1) if latencies else 0.0,
+                "latency_ms_p95": round(1000 * _percentile(latencies, 95), 1),
+                "latency_ms_max": round(1000 * max(latencies), 1) if latencies else 0.0,
+                "active_sessions": self.active,
+                "peak_sessions": self.peak,
+            }
+            write_message(writer, MSG_STATS, json.dumps(stats).encode())
+            await writer.drain()
+            print(f"📊 Session {session_id}: {phrases} phrases, {audio_seconds:.1f}s audio, "
+                  f"latency mean {stats['latency_ms_mean']} ms / p95 {stats['latency_ms_p95']} ms")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            print(f"⚠️ Session {session_id} disconnected")
+        finally:
+            self.active -= 1
+            writer.close()
+
+    async def _emit(self, writer, result_json, clean, received):
+        """Filter one final result and send it (plus the audio it completes, if requested)."""
+        import part2
+
+        result = json.loads(result_json)
+        text = result.get("text", "").strip()
+        if not text:
+            if clean is not None:
+                write_message(writer, MSG_CLEAN_AUDIO, clean.release().tobytes())
+                await writer.drain()
+            return False
+
+        # Phrases from all sessions are micro-batched by part2's scheduler
+        filtered, flagged = await asyncio.wrap_future(part2.scheduler.submit(text, verbose=False))
+        words = result.get("result", [])
+
+        message = {
+            "text": text,
+            "filtered": filtered,
+            "flagged": [
+                {"word": word, "score": score,
+                 "start": words[i]["start"] if i < len(words) else None,
+                 "end": words[i]["end"] if i < len(words) else None}
+                for i, word, score in flagged
+            ],
+            "latency_ms": round(1000 * (time.perf_counter() - received), 1),
+        }
+        write_message(writer, MSG_RESULT, json.dumps(message).encode())
+
+        if clean is not None:
+            from part3 import censored_spans
+            spans = censored_spans({"words": words}, filtered)
+            write_message(writer, MSG_CLEAN_AUDIO, clean.release(spans).tobytes())
+
+        await writer.drain()
+        return True
+
+
+async def stream_wav(path, host=HOST, port=PORT, realtime=True, save_dir=None):
+    """Stream one WAV to the server as a client session and print its results."""
+    name = os.path.basename(path)
+    with wave.open(path, "rb") as wav_file:
+        rate = wav_file.getframerate()
+        channels = wav_file.getnchannels()
+        if wav_file.getsampwidth() != 2:
+            raise ValueError(f"{name}: only 16-bit PCM WAV files are supported")
+        frames = wav_file.readframes(wav_file.getnframes())
+    samples = np.frombuffer(frames, dtype=np.int16)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+
+    reader, writer = await asyncio.open_connection(host, port)
+    header = {"rate": rate, "clean_audio": save_dir is not None, "name": name}
+    write_message(writer, MSG_HEADER, json.dumps(header).encode())
+
+    cleaned = []
+
+    async def receive():
+        while True:
+            kind, payload = await read_message(reader)
+            if kind == MSG_RESULT:
+                msg = json.loads(payload)
+                print(f"[{name}] {msg['filtered']}  ({msg['latency_ms']} ms)")
+            elif kind == MSG_CLEAN_AUDIO:
+                cleaned.append(np.frombuffer(payload, dtype=np.int16))
+            elif kind == MSG_STATS:
+                return json.loads(payload)
+
+    receiver = asyncio.create_task(receive())
+
+    chunk = int(rate * CLIENT_CHUNK_SECONDS)
+    for start in range(0, len(samples), chunk):
+        write_message(writer, MSG_AUDIO, samples[start:start + chunk].tobytes())
+        await writer.drain()
+        if realtime:
+            await asyncio.sleep(CLIENT_CHUNK_SECONDS)
+    write_message(writer, MSG_END)
+    await writer.drain()
+
+    stats = await receiver
+    writer.close()
+
+    if save_dir and cleaned:
+        os.makedirs(save_dir, exist_ok=True)
+        out_path = os.path.join(save_dir, os.path.splitext(name)[0] + ".clean.wav")
+        with wave.open(out_path, "wb") as out:
+            out.setnchannels(1)
+            out.setsampwidth(2)
+            out.setframerate(rate)
+            out.writeframes(np.concatenate(cleaned).tobytes())
+    return stats
+
+
+async def run_clients(paths, host=HOST, port=PORT, realtime=True, save_dir=None):
+    """Stream several WAV files concurrently, one session each."""
+    results = await asyncio.gather(
+        *(stream_wav(p, host, port, realtime, save_dir) for p in paths),
+        return_exceptions=True
+    )
+    for path, stats in zip(paths, results):
+        if isinstance(stats, Exception):
+            print(f"❌ {path}: {stats}")
+        else:
+            print(json.dumps(stats))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EchoClean multi-session moderation server")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="run the server")
+    serve.add_argument("--host", default=HOST)
+    serve.add_argument("--port", type=int, default=PORT)
+    serve.add_argument("--model", default=None, help="Vosk model directory")
+    serve.add_argument("--workers", type=int, default=None, help="decode/scoring threads")
+
+    client = sub.add_parser("client", help="stream WAV files to a running server")
+    client.add_argument("files", nargs="+")
+    client.add_argument("--host", default=HOST)
+    client.add_argument("--port", type=int, default=PORT)
+    client.add_argument("--fast", action="store_true", help="send as fast as possible, not real time")
+    client.add_argument("--save-audio", default=None, help="directory for cleaned audio WAVs")
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = ModerationServer(args.model, args.workers)
+        server.preload()
+        try:
+            asyncio.run(server.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            print("\n👋 Stopping...")
+    else:
+        results = asyncio.run(run_clients(args.files, args.host, args.port,
+                                          not args.fast, args.save_audio))
+        if any(isinstance(r, Exception) for r in results):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# tracing.py - Per-phrase latency tracing with HDR-style histograms
+import json
+import threading
+import time
+
+TRACING_ENABLED = True
+
+# A trace is a dict of stage -> time.perf_counter(), stamped along the way:
+#   capture         first audio frame of the phrase captured (written to part1's ring)
+#   audio_start     first audio frame of the phrase fed to Vosk (part1)
+#   asr_final       Vosk final result
+#   first_flag      a toxic word flagged from the partial hypothesis (GUIAPP)
+#   filter_start    filtering picked up by a worker (GUIAPP)
+#   filter_end      censored text ready
+#   tts_start       TTS worker starts on the phrase (part3)
+#   playback_start  first audio of the phrase handed to the output stream
+SPANS = (
+    ("capture_queue", "capture", "audio_start"),  # capture ring backlog and VAD hold-back
+    ("asr", "audio_start", "asr_final"),
+    ("filter_queue", "asr_final", "filter_start"),
+    ("filter", "filter_start", "filter_end"),
+    ("tts_queue", "filter_end", "tts_start"),
+    ("synthesis", "tts_start", "playback_start"),
+    ("response", "asr_final", "playback_start"),
+    ("end_to_end", "capture", "playback_start"),
+    ("first_flag", "audio_start", "first_flag"),
+    ("flag_lead", "first_flag", "asr_final"),  # how long before the final result (0 if after)
+)
+FOOTER_SPANS = ("filter", "response")
+
+
+class HdrHistogram:
+    """
+    Log-linear histogram of microsecond values in the spirit of
+    HdrHistogram: 2**SUB_BITS buckets per power of two keep every
+    recorded value within ~3% of its bucket, with bounded memory.
+    """
+
+    SUB_BITS = 6
+
+    def __init__(self):
+        self.counts = {}  # bucket index -> count
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def _index(self, value):
+        half = 1 << (self.SUB_BITS - 1)
+        if value < 2 * half:
+            return value
+        shift = value.bit_length() - self.SUB_BITS
+        return half * shift + (value >> shift)
+
+    def _value(self, index):
+        """Midpoint of a bucket, in microseconds."""
+        half = 1 << (self.SUB_BITS - 1)
+        if index < 2 * half:
+            return index
+        shift = index // half - 1
+        top = index - half * shift
+        return ((top << shift) + ((top + 1) << shift) - 1) // 2
+
+    def record(self, seconds):
+        value = max(int(seconds * 1_000_000), 0)
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, pct):
+        """Value at the given percentile, in seconds."""
+        if not self.count:
+            return 0.0
+        target = max(1, int(round(pct / 100 * self.count)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._value(index), self.max) / 1_000_000
+        return self.max / 1_000_000
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count / 1000, 2) if self.count else 0.0,
+            "min_ms": round((self.min or 0) / 1000, 2),
+            "p50_ms": round(self.percentile(50) * 1000, 2),
+            "p95_ms": round(self.percentile(95) * 1000, 2),
+            "p99_ms": round(self.percentile(99) * 1000, 2),
+            "max_ms": round(self.max / 1000, 2),
+        }
+
+
+_lock = threading.Lock()
+_histograms = {name: HdrHistogram() for name, _, _ in SPANS}
+_collectors = {}  # name -> function returning a flat dict of other metrics
+
+
+def register_collector(name, collect):
+    """
+    Include another component's metrics in exports. collect() returns a flat
+    dict: numbers become gauges (counters if the key ends in _total) and
+    strings become labels of an info metric.
+    """
+    with _lock:
+        _collectors[name] = collect
+
+
+def start(**stamps):
+    """
+    Begin a trace, optionally with stamps already taken
+    (e.g. start(audio_start=t)). Returns None when tracing is disabled;
+    every other function accepts None and does nothing.
+    """
+    if not TRACING_ENABLED:
+        return None
+    return {stage: at for stage, at in stamps.items() if at is not None}
+
+
+def mark(trace, stage):
+    """Stamp a stage on a trace (only the first stamp of a stage counts)."""
+    if trace is not None and stage not in trace:
+        trace[stage] = time.perf_counter()
+
+
+def finish(trace):
+    """Fold a trace's stage durations into the histograms (once per trace)."""
+    if trace is None:
+        return
+    with _lock:
+        if trace.get("_done"):
+            return
+        trace["_done"] = True
+        for name, begin, end in SPANS:
+            if begin in trace and end in trace:
+                _histograms[name].record(trace[end] - trace[begin])
+
+
+def reset():
+    """Clear all histograms."""
+    with _lock:
+        for name in _histograms:
+            _histograms[name] = HdrHistogram()
+
+
+def snapshot():
+    """Return {span: {count, mean_ms, min_ms, p50_ms, p95_ms, p99_ms, max_ms}}."""
+    with _lock:
+        return {name: hist.summary() for name, hist in _histograms.items()}
+
+
+def to_json():
+    data = snapshot()
+    for name, collect in list(_collectors.items()):
+        data[name] = collect()
+    return json.dumps(data, indent=2)
+
+
+def to_prometheus():
+    """Render the histograms as Prometheus summaries (text exposition format)."""
+    lines = [
+        "# HELP echoclean_stage_latency_seconds Per-phrase latency of each pipeline stage.",
+        "# TYPE echoclean_stage_latency_seconds summary",
+    ]
+    with _lock:
+        for name, hist in _histograms.items():
+            for quantile in (0.5, 0.95, 0.99):
+                lines.append(f'echoclean_stage_latency_seconds{{stage="{name}",quantile="{quantile}"}} '
+                             f"{hist.percentile(quantile * 100):.6f}")
+            lines.append(f'echoclean_stage_latency_seconds_sum{{stage="{name}"}} {hist.total / 1_000_000:.6f}')
+            lines.append(f'echoclean_stage_latency_seconds_count{{stage="{name}"}} {hist.count}')
+        collectors = list(_collectors.items())
+
+    for name, collect in collectors:
+        values = collect()
+        labels = ",".join(f'{key}="{value}"' for key, value in values.items() if isinstance(value, str))
+        if labels:
+            lines.append(f"# TYPE echoclean_{name}_info gauge")
+            lines.append(f"echoclean_{name}_info{{{labels}}} 1")
+        for key, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"# TYPE echoclean_{name}_{key} {'counter' if key.endswith('_total') else 'gauge'}")
+                lines.append(f"echoclean_{name}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def export(path):
+    """Write the histograms (and collectors) to path: Prometheus text for .prom/.txt, JSON otherwise."""
+    text = to_prometheus() if path.endswith((".prom", ".txt")) else to_json()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+def footer_text():
+    """Short p50/p95 summary for the GUI stats footer ('' until data arrives)."""
+    stats = snapshot()
+    parts = [
+        f"{name} {stats[name]['p50_ms']:.0f}/{stats[name]['p95_ms']:.0f} ms"
+        for name in FOOTER_SPANS if stats[name]["count"]
+    ]
+    return "p50/p95: " + ", ".join(parts) if parts else ""